@@ -2,309 +2,285 @@
 Data Dash - Premium Analytics Dashboard
 """
 
-import io
+import re
+
 import streamlit as st
 import pandas as pd
-from pathlib import Path
-import sys
-
-sys.path.insert(0, str(Path(__file__).parent))
-
-from src.load import prepare_data, filter_data, get_filter_options
-from src.metrics import (
-    calculate_kpis, calculate_monthly_metrics, get_top_items,
-    get_category_breakdown, get_region_breakdown, get_top_customers,
-    calculate_repeat_customers, get_segment_breakdown, get_return_metrics,
-    get_items_by_return_rate
-)
-from src.charts import (
-    create_monthly_trend_chart, create_top_items_chart, create_category_chart,
-    create_bar_chart, create_customers_chart, create_pie_chart,
-    create_return_rate_chart, create_monthly_change_chart
-)
+from pandas.tseries.api import guess_datetime_format
 
-st.set_page_config(page_title="Data Dash", page_icon="â—†", layout="wide", initial_sidebar_state="collapsed")
+from src.load import FILE_READ_ERRORS, file_fingerprint, load_file, to_table, table_to_frame, prepare_data, filter_data, get_filter_options
+from src.metrics import ORDER_FREQUENCY_LABELS, calculate_sections, rank_top
+from src.styles import load_chrome
 
-# Premium Apple/Samsung-inspired CSS
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap');
-    :root {
-        --bg: #000000;
-        --surface: rgba(255,255,255,0.04);
-        --glass: rgba(255,255,255,0.06);
-        --border: rgba(255,255,255,0.08);
-        --text: #f5f5f7;
-        --text-sec: #86868b;
-        --accent: #2997ff;
-        --accent2: #bf5af2;
-        --green: #30d158;
-        --red: #ff453a;
-        --orange: #ff9f0a;
-        --radius: 16px;
-    }
-    * { font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif !important; }
-    .stApp { background: var(--bg); }
-    [data-testid="stSidebar"] {
-        background: rgba(28,28,30,0.95);
-        backdrop-filter: blur(40px);
-        -webkit-backdrop-filter: blur(40px);
-        border-right: 1px solid var(--border);
-    }
-    [data-testid="stSidebar"] * { color: var(--text-sec) !important; }
-    [data-testid="stSidebar"] label, [data-testid="stSidebar"] .stMarkdown p { color: var(--text) !important; font-weight: 500; }
-    #MainMenu, footer, header { visibility: hidden; }
-    .hero { text-align: center; padding: 60px 20px 40px 20px; }
-    .hero-badge {
-        display: inline-block; padding: 6px 16px; border-radius: 100px;
-        background: rgba(41,151,255,0.12); color: var(--accent);
-        font-size: 0.8rem; font-weight: 600; letter-spacing: 0.5px;
-        text-transform: uppercase; margin-bottom: 20px;
-    }
-    .hero h1 {
-        font-size: 3.4rem; font-weight: 800; letter-spacing: -1.5px; line-height: 1.1;
-        background: linear-gradient(135deg, #f5f5f7 0%, #86868b 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;
-        background-clip: text; margin: 0 0 16px 0;
-    }
-    .hero p { color: var(--text-sec); font-size: 1.15rem; font-weight: 400; max-width: 520px; margin: 0 auto; line-height: 1.6; }
-    .sep { height: 1px; background: var(--border); margin: 40px 0; }
-    .sec-label { font-size: 0.75rem; font-weight: 600; letter-spacing: 1.5px; text-transform: uppercase; color: var(--accent); margin: 0 0 8px 0; }
-    .sec-title { font-size: 1.6rem; font-weight: 700; color: var(--text); letter-spacing: -0.5px; margin: 0 0 24px 0; }
-    .glass-card {
-        background: var(--glass); backdrop-filter: blur(20px); -webkit-backdrop-filter: blur(20px);
-        border: 1px solid var(--border); border-radius: var(--radius); padding: 28px;
-        transition: all 0.35s cubic-bezier(.25,.8,.25,1);
-    }
-    .glass-card:hover { background: rgba(255,255,255,0.08); border-color: rgba(255,255,255,0.14); transform: translateY(-2px); }
-    .step-num {
-        font-size: 3rem; font-weight: 800;
-        background: linear-gradient(135deg, var(--accent), var(--accent2));
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; line-height: 1;
-    }
-    .step-label { font-size: 1rem; font-weight: 600; color: var(--text); margin: 12px 0 6px 0; }
-    .step-sub { font-size: 0.85rem; color: var(--text-sec); }
-    .ready-banner {
-        background: linear-gradient(135deg, rgba(48,209,88,0.08), rgba(41,151,255,0.08));
-        border: 1px solid rgba(48,209,88,0.15); border-radius: var(--radius); padding: 20px 28px; margin-bottom: 32px;
-    }
-    .ready-banner strong { color: var(--green); }
-    .ready-banner span { color: var(--text-sec); font-size: 0.9rem; }
-    .info-banner {
-        background: rgba(41,151,255,0.06); border: 1px solid rgba(41,151,255,0.12);
-        border-radius: var(--radius); padding: 20px 28px; color: var(--text-sec); font-size: 0.9rem; line-height: 1.7;
-    }
-    .info-banner strong { color: var(--text); }
-    .info-banner ol { margin: 12px 0 0 20px; padding: 0; }
-    .info-banner li { margin: 6px 0; }
-    .stMetric {
-        background: var(--glass) !important; border: 1px solid var(--border) !important;
-        border-radius: var(--radius) !important; padding: 20px !important;
-    }
-    [data-testid="stMetricValue"] { color: var(--text) !important; font-weight: 700 !important; font-size: 1.5rem !important; }
-    [data-testid="stMetricLabel"] { color: var(--text-sec) !important; font-weight: 500 !important; text-transform: uppercase !important; font-size: 0.7rem !important; letter-spacing: 0.8px !important; }
-    [data-testid="stMetricDelta"] { font-weight: 600 !important; }
-    .stButton > button {
-        background: var(--accent) !important; color: #fff !important; border: none !important;
-        border-radius: 100px !important; padding: 10px 28px !important; font-weight: 600 !important;
-        font-size: 0.9rem !important; transition: all 0.3s !important;
-    }
-    .stButton > button:hover { background: #0a84ff !important; box-shadow: 0 4px 20px rgba(41,151,255,0.35) !important; transform: scale(1.02) !important; }
-    [data-testid="stFileUploader"] {
-        background: var(--glass); border: 2px dashed rgba(255,255,255,0.1);
-        border-radius: var(--radius); padding: 20px; transition: all 0.3s;
-    }
-    [data-testid="stFileUploader"]:hover { border-color: var(--accent); background: rgba(41,151,255,0.04); }
-    [data-testid="stSelectbox"] > div > div { background: var(--surface) !important; border-color: var(--border) !important; border-radius: 10px !important; color: var(--text) !important; }
-    .stTabs [data-baseweb="tab-list"] { gap: 0; background: var(--surface); border-radius: 10px; padding: 3px; }
-    .stTabs [data-baseweb="tab"] { border-radius: 8px; padding: 8px 20px; color: var(--text-sec); font-weight: 500; }
-    .stTabs [aria-selected="true"] { background: var(--glass) !important; color: var(--text) !important; }
-    .streamlit-expanderHeader { background: var(--surface) !important; border-radius: 12px !important; font-weight: 500 !important; color: var(--text-sec) !important; }
-    .stRadio > div { gap: 0 !important; }
-    .stRadio [role="radiogroup"] { background: var(--surface); border-radius: 10px; padding: 3px; }
-    [data-testid="stDataFrame"] { border: 1px solid var(--border); border-radius: var(--radius); }
-    .site-footer { text-align: center; padding: 60px 0 30px 0; color: var(--text-sec); font-size: 0.8rem; }
-    .site-footer span { background: linear-gradient(135deg, var(--accent), var(--accent2)); -webkit-background-clip: text; -webkit-text-fill-color: transparent; background-clip: text; font-weight: 600; }
-    .file-badge { display: inline-flex; align-items: center; gap: 10px; background: var(--glass); border: 1px solid var(--border); border-radius: 12px; padding: 14px 20px; margin: 8px 0 20px 0; }
-    .file-badge .dot { width: 8px; height: 8px; border-radius: 50%; background: var(--green); }
-    .file-badge .fname { color: var(--text); font-weight: 600; font-size: 0.95rem; }
-    .file-badge .fmeta { color: var(--text-sec); font-size: 0.8rem; }
-
-    /* Animated background canvas */
-    #bg-canvas {
-        position: fixed;
-        top: 0; left: 0;
-        width: 100vw; height: 100vh;
-        z-index: 0;
-        pointer-events: none;
-    }
+DATE_NAME_HINTS = frozenset(('date', 'dates', 'datetime', 'time', 'day', 'month', 'year', 'created', 'updated', 'timestamp', 'ts'))
 
-    /* Floating gradient orbs */
-    .orb {
-        position: fixed;
-        border-radius: 50%;
-        filter: blur(80px);
-        z-index: 0;
-        pointer-events: none;
-        animation: orbFloat linear infinite;
-    }
-    .orb-1 {
-        width: 500px; height: 500px;
-        background: radial-gradient(circle, rgba(41,151,255,0.12) 0%, transparent 70%);
-        top: -100px; left: -100px;
-        animation-duration: 20s;
-        animation-delay: 0s;
-    }
-    .orb-2 {
-        width: 600px; height: 600px;
-        background: radial-gradient(circle, rgba(191,90,242,0.10) 0%, transparent 70%);
-        top: 30vh; right: -150px;
-        animation-duration: 25s;
-        animation-delay: -8s;
-    }
-    .orb-3 {
-        width: 400px; height: 400px;
-        background: radial-gradient(circle, rgba(48,209,88,0.07) 0%, transparent 70%);
-        bottom: 10vh; left: 20vw;
-        animation-duration: 18s;
-        animation-delay: -12s;
-    }
-    @keyframes orbFloat {
-        0%   { transform: translate(0px, 0px) scale(1); }
-        25%  { transform: translate(40px, -30px) scale(1.05); }
-        50%  { transform: translate(20px, 50px) scale(0.97); }
-        75%  { transform: translate(-30px, 20px) scale(1.03); }
-        100% { transform: translate(0px, 0px) scale(1); }
-    }
+# Words of a column name: split at underscores, spaces and other punctuation,
+# and at camelCase humps ('orderDate' -> 'order', 'Date')
+NAME_WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
 
-    /* Ensure Streamlit content sits above the canvas */
-    .stApp > div { position: relative; z-index: 1; }
-    [data-testid="stAppViewContainer"] { position: relative; z-index: 1; }
-</style>
-""", unsafe_allow_html=True)
-
-# Animated background: deep-space particles + shooting stars + orbs
-st.markdown("""
-<div class="orb orb-1"></div>
-<div class="orb orb-2"></div>
-<div class="orb orb-3"></div>
-<canvas id="bg-canvas"></canvas>
-<script>
-(function() {
-    var canvas = document.getElementById('bg-canvas');
-    if (!canvas) return;
-    var ctx = canvas.getContext('2d');
-    function resize() { canvas.width = window.innerWidth; canvas.height = window.innerHeight; }
-    resize();
-    window.addEventListener('resize', resize);
-    function rand(a,b){return Math.random()*(b-a)+a;}
-    var mouse={x:-9999,y:-9999};
-    window.addEventListener('mousemove',function(e){mouse.x=e.clientX;mouse.y=e.clientY;});
-    window.addEventListener('mouseleave',function(){mouse.x=-9999;mouse.y=-9999;});
-    var PAL=[[41,151,255],[191,90,242],[100,210,255],[48,209,88],[255,159,10]];
-    var NUM=90, particles=[];
-    for(var i=0;i<NUM;i++){
-        var c=PAL[Math.floor(Math.random()*PAL.length)];
-        particles.push({x:rand(0,window.innerWidth),y:rand(0,window.innerHeight),
-            vx:rand(-0.3,0.3),vy:rand(-0.3,0.3),r:rand(1.2,3.0),
-            cr:c[0],cg:c[1],cb:c[2],alpha:rand(0.4,1.0),
-            ps:rand(0.01,0.03),po:rand(0,Math.PI*2)});
-    }
-    var stars=[], ripples=[], frame=0;
-    function spawnStar(){
-        var c=PAL[Math.floor(Math.random()*PAL.length)];
-        var ang=rand(-0.3,0.3)+Math.PI*0.25, spd=rand(8,18);
-        stars.push({x:rand(0,window.innerWidth),y:rand(0,window.innerHeight*0.5),
-            vx:Math.cos(ang)*spd,vy:Math.sin(ang)*spd,
-            len:rand(60,160),life:1.0,decay:rand(0.012,0.025),cr:c[0],cg:c[1],cb:c[2]});
-    }
-    for(var s=0;s<3;s++) spawnStar();
-    window.addEventListener('click',function(e){ripples.push({x:e.clientX,y:e.clientY,r:0,life:1.0});});
-    function draw(){
-        frame++;
-        ctx.clearRect(0,0,canvas.width,canvas.height);
-        if(frame%120===0) spawnStar();
-        for(var s=stars.length-1;s>=0;s--){
-            var st=stars[s];
-            var g=ctx.createLinearGradient(st.x,st.y,st.x-st.vx*(st.len/10),st.y-st.vy*(st.len/10));
-            g.addColorStop(0,'rgba('+st.cr+','+st.cg+','+st.cb+','+st.life*0.9+')');
-            g.addColorStop(1,'rgba('+st.cr+','+st.cg+','+st.cb+',0)');
-            ctx.beginPath();ctx.moveTo(st.x,st.y);
-            ctx.lineTo(st.x-st.vx*(st.len/10),st.y-st.vy*(st.len/10));
-            ctx.strokeStyle=g;ctx.lineWidth=1.5*st.life;ctx.stroke();
-            ctx.beginPath();ctx.arc(st.x,st.y,2*st.life,0,Math.PI*2);
-            ctx.fillStyle='rgba('+st.cr+','+st.cg+','+st.cb+','+st.life+')';ctx.fill();
-            st.x+=st.vx;st.y+=st.vy;st.life-=st.decay;
-            if(st.life<=0) stars.splice(s,1);
-        }
-        for(var ri=ripples.length-1;ri>=0;ri--){
-            var rp=ripples[ri];
-            ctx.beginPath();ctx.arc(rp.x,rp.y,rp.r,0,Math.PI*2);
-            ctx.strokeStyle='rgba(41,151,255,'+rp.life*0.5+')';ctx.lineWidth=1.5;ctx.stroke();
-            rp.r+=4;rp.life-=0.03;
-            if(rp.life<=0) ripples.splice(ri,1);
-        }
-        var MD=150, MOUSE_D=200;
-        for(var i=0;i<particles.length;i++){
-            var p=particles[i];
-            var pulse=Math.sin(frame*p.ps+p.po)*0.25+0.75, a=p.alpha*pulse;
-            for(var j=i+1;j<particles.length;j++){
-                var q=particles[j];
-                var dx=p.x-q.x,dy=p.y-q.y,dist=Math.sqrt(dx*dx+dy*dy);
-                if(dist<MD){
-                    var la=(1-dist/MD)*0.2*pulse;
-                    ctx.beginPath();ctx.moveTo(p.x,p.y);ctx.lineTo(q.x,q.y);
-                    ctx.strokeStyle='rgba('+p.cr+','+p.cg+','+p.cb+','+la+')';
-                    ctx.lineWidth=0.6;ctx.stroke();
-                }
-            }
-            var mdx=mouse.x-p.x,mdy=mouse.y-p.y,md=Math.sqrt(mdx*mdx+mdy*mdy);
-            if(md<MOUSE_D){
-                var ma=(1-md/MOUSE_D)*0.5;
-                ctx.beginPath();ctx.moveTo(p.x,p.y);ctx.lineTo(mouse.x,mouse.y);
-                ctx.strokeStyle='rgba('+p.cr+','+p.cg+','+p.cb+','+ma+')';
-                ctx.lineWidth=0.9;ctx.stroke();
-                var force=(1-md/MOUSE_D)*0.5;
-                p.vx-=(mdx/md)*force*0.06;p.vy-=(mdy/md)*force*0.06;
-            }
-            var spd=Math.sqrt(p.vx*p.vx+p.vy*p.vy);
-            if(spd>1.2){p.vx*=0.95;p.vy*=0.95;}
-            if(spd<0.1){p.vx+=rand(-0.05,0.05);p.vy+=rand(-0.05,0.05);}
-            var grd=ctx.createRadialGradient(p.x,p.y,0,p.x,p.y,p.r*4);
-            grd.addColorStop(0,'rgba('+p.cr+','+p.cg+','+p.cb+','+a+')');
-            grd.addColorStop(0.4,'rgba('+p.cr+','+p.cg+','+p.cb+','+(a*0.3)+')');
-            grd.addColorStop(1,'rgba('+p.cr+','+p.cg+','+p.cb+',0)');
-            ctx.beginPath();ctx.arc(p.x,p.y,p.r*4,0,Math.PI*2);ctx.fillStyle=grd;ctx.fill();
-            ctx.beginPath();ctx.arc(p.x,p.y,p.r,0,Math.PI*2);
-            ctx.fillStyle='rgba('+p.cr+','+p.cg+','+p.cb+','+a+')';ctx.fill();
-            p.x+=p.vx;p.y+=p.vy;
-            if(p.x<-10)p.x=canvas.width+10;
-            if(p.x>canvas.width+10)p.x=-10;
-            if(p.y<-10)p.y=canvas.height+10;
-            if(p.y>canvas.height+10)p.y=-10;
-        }
-        requestAnimationFrame(draw);
-    }
-    draw();
-})();
-</script>
-""", unsafe_allow_html=True)
+st.set_page_config(page_title="Data Dash", page_icon="â—†", layout="wide", initial_sidebar_state="collapsed")
 
 
-def detect_column_types(df):
+# Premium Apple/Samsung-inspired chrome. Streamlit drops elements that are
+# not re-emitted on a rerun, so it is written every run as a single element;
+# only building the string is cached.
+st.markdown(load_chrome(), unsafe_allow_html=True)
+
+
+def name_hints_date(col):
+    """Check whether any word of a column name is a date hint; 'Products' is not a 'ts'."""
+    return any(word.lower() in DATE_NAME_HINTS for word in NAME_WORD.findall(str(col)))
+
+
+def looks_like_dates(values):
+    """
+    Guess a datetime format from one value and check it on a 20-row sample.
+    
+    Unparseable values are coerced to NaT rather than raised, and the
+    column counts as dates when over 80% of the sample parses.
+    """
+    sample = values.head(100).dropna().iloc[:20]
+    if sample.empty:
+        return False
+    fmt = guess_datetime_format(str(sample.iloc[0]))
+    if fmt is None:
+        return False
+    parsed = pd.to_datetime(sample, format=fmt, errors='coerce')
+    return parsed.notna().mean() > 0.8
+
+
+@st.cache_data(show_spinner=False)
+def detect_column_types(_df, fingerprint):
+    """
+    Bucket columns into date, numeric and category candidates.
+    
+    Cached on the upload's fingerprint (contents and row limit), so the
+    frame itself is never hashed, the probe runs once per upload, and a
+    re-exported file with the same name and schema is probed afresh.
+    """
+    df = _df
     date_cols, numeric_cols, category_cols = [], [], []
-    for col in df.columns:
-        if df[col].dtype == 'datetime64[ns]':
+    # Dispatch on the one-character dtype kind; Arrow dtypes report the kind
+    # of their NumPy equivalent ('M' timestamps, 'U' strings).
+    for col, dtype in zip(df.columns, df.dtypes.values):
+        kind = dtype.kind
+        if kind == 'M':
             date_cols.append(col)
-        elif df[col].dtype == 'object':
-            try:
-                pd.to_datetime(df[col].head(100), errors='raise')
+        elif kind in 'iufc':
+            numeric_cols.append(col)
+        elif kind in 'OUS':
+            # Only columns whose name hints at a date pay for the parse probe;
+            # sparse text columns on very large frames are never useful dates
+            if not name_hints_date(col):
+                category_cols.append(col)
+            elif len(df) > 1_000_000 and df[col].isna().mean() > 0.5:
+                category_cols.append(col)
+            elif looks_like_dates(df[col]):
                 date_cols.append(col)
-            except:
+            else:
                 category_cols.append(col)
-        elif pd.api.types.is_numeric_dtype(df[col]):
-            numeric_cols.append(col)
-    return date_cols, numeric_cols, category_cols
+        elif kind == 'b':
+            category_cols.append(col)
+    return tuple(date_cols), tuple(numeric_cols), tuple(category_cols)
+
+
+def section_header(label, title, sep=True):
+    """Write a section's separator, label and title as a single element."""
+    html = '<div class="sep"></div>' if sep else ''
+    html += f'<p class="sec-label">{label}</p><p class="sec-title">{title}</p>'
+    st.markdown(html, unsafe_allow_html=True)
+
+
+def narrowed(selected, options):
+    """Return the selection only if it excludes some option, else None.
+
+    The multiselects default to every option, and a selection covering all
+    of them filters nothing, so the per-row isin over the column is skipped.
+    """
+    if selected and len(set(selected)) < len(options):
+        return selected
+    return None
+
+
+def kpi_row(cards):
+    """
+    Render a row of KPI cards as one HTML element instead of a column and
+    metric widget per card.
+
+    Each card is (label, value) or (label, value, delta, tone), where tone
+    is 'up', 'down' or 'off' and picks the delta colour.
+    """
+    html = []
+    for label, value, *delta in cards:
+        card = f'<div class="kpi-label">{label}</div><div class="kpi-value">{value}</div>'
+        if delta:
+            text, tone = delta
+            card += f'<div class="kpi-delta {tone}">{text}</div>'
+        html.append(f'<div class="kpi-card">{card}</div>')
+    st.markdown(f'<div class="kpi-grid">{"".join(html)}</div>', unsafe_allow_html=True)
+
+
+# Format for money columns: whole dollars with digit grouping, as the tables
+# showed before. The 'dollar' preset always shows cents and printf formats
+# cannot group digits, so the values are rounded, shown 'localized', and the
+# currency goes in the header.
+WHOLE_DOLLARS = 'whole dollars'
+
+
+def number_table(df, formats):
+    """
+    A table and the column config that formats its numbers in the browser
+    instead of a pandas Styler.
+
+    Formats are Streamlit presets, printf strings or WHOLE_DOLLARS; use
+    'localized' for large counts, since printf has no thousands separator.
+    """
+    whole = {col: 0 for col, fmt in formats.items() if fmt == WHOLE_DOLLARS and col in df.columns}
+    config = {
+        col: st.column_config.NumberColumn(f"{col} ($)", format='localized') if col in whole else st.column_config.NumberColumn(format=fmt)
+        for col, fmt in formats.items() if col in df.columns
+    }
+    return (df.round(whole) if whole else df), config
+
+
+@st.fragment
+def overview_section(filter_opts, kpis, metrics_avail, monthly_data, breakdown_cols, product_totals):
+    """KPIs, trends, breakdowns and top products; its widgets rerun only this section."""
+    # Charts (and Plotly with them) load on first use, not for the landing page
+    from src.charts import create_monthly_trend_chart, create_category_chart, create_top_items_chart
+
+    section_header("Overview", "Key Metrics", sep=False)
+    cards = [("Total Revenue", f"${kpis['total_sales']:,.0f}")]
+    if filter_opts.has_profit:
+        cards.append(("Total Profit", f"${kpis['total_profit']:,.0f}", f"{kpis['profit_margin']:.1f}% margin", 'up' if kpis['profit_margin'] >= 0 else 'down'))
+    else:
+        cards.append(("Records", f"{kpis['row_count']:,}"))
+    if filter_opts.has_order_id:
+        cards.append(("Orders", f"{kpis['total_orders']:,}"))
+    elif filter_opts.has_customer:
+        cards.append(("Customers", f"{kpis['total_customers']:,}"))
+    else:
+        cards.append(("Avg Value", f"${kpis['avg_value_per_row']:,.2f}"))
+    if kpis['total_orders'] > 0:
+        cards.append(("Avg Order Value", f"${kpis['avg_order_value']:,.2f}"))
+    elif filter_opts.has_quantity:
+        cards.append(("Total Quantity", f"{kpis['total_quantity']:,.0f}"))
+    else:
+        cards.append(("Data Points", f"{kpis['row_count']:,}"))
+    kpi_row(cards)
+
+    if monthly_data is not None and len(monthly_data) > 1:
+        available_metrics = [c for c in metrics_avail if c in monthly_data.columns]
+        if available_metrics:
+            st.markdown("#### Trends")
+            tabs = st.tabs(available_metrics)
+            for i, metric in enumerate(available_metrics):
+                with tabs[i]:
+                    fig = create_monthly_trend_chart(monthly_data, metric)
+                    if fig:
+                        st.plotly_chart(fig, use_container_width=True)
+
+    if breakdown_cols:
+        st.markdown("#### Breakdown")
+        cols = st.columns(len(breakdown_cols))
+        for i, (name, data) in enumerate(breakdown_cols):
+            with cols[i]:
+                if data is not None and len(data) > 0:
+                    view = st.radio(f"{name}", ["Bar", "Pie"], horizontal=True, key=f"{name}_view")
+                    fig = create_category_chart(data, 'pie' if view == "Pie" else 'bar')
+                    if fig:
+                        st.plotly_chart(fig, use_container_width=True)
+
+    if filter_opts.has_product:
+        st.markdown("#### Top Products")
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            top_n = st.slider("Show top", 5, 20, 10, key="top_prod_slider")
+            metric_choice = st.radio("Rank by", metrics_avail, horizontal=True, key="product_metric")
+            top_products = rank_top(product_totals, n=top_n, by=metric_choice)
+            if top_products is not None:
+                fig = create_top_items_chart(top_products, metric_choice)
+                if fig:
+                    st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            if top_products is not None:
+                dcols = [c for c in ['Name', 'Sales', 'Profit', 'Quantity'] if c in top_products.columns]
+                table, config = number_table(top_products[dcols], {'Sales': WHOLE_DOLLARS, 'Profit': WHOLE_DOLLARS, 'Quantity': 'localized'})
+                st.dataframe(table, column_config=config, use_container_width=True, height=400)
+
+
+@st.fragment
+def customers_section(filter_opts, kpis, loyalty, customer_totals):
+    """Repeat-customer metrics, the top customers chart and table, and order frequency."""
+    from src.charts import create_customers_chart, create_order_frequency_chart
+
+    section_header("Customers", "Buyers & Loyalty")
+    kpi_row([
+        ("Total Customers", f"{loyalty['total_customers']:,}"),
+        ("Repeat Customers", f"{loyalty['repeat_customers']:,}", f"{loyalty['repeat_rate']:.1f}%", 'up'),
+        ("Avg Revenue / Customer", f"${kpis['avg_revenue_per_customer']:,.0f}"),
+        ("Avg Orders / Customer", f"{kpis['avg_orders_per_customer']:.1f}") if filter_opts.has_order_id else ("Total Revenue", f"${kpis['total_sales']:,.0f}"),
+    ])
+    st.markdown("#### Top Customers")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        top_n_c = st.slider("Show top", 5, 20, 10, key="top_cust_slider")
+        top_customers = rank_top(customer_totals, n=top_n_c)
+        if top_customers is not None and len(top_customers) > 0:
+            fig = create_customers_chart(top_customers)
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        if top_customers is not None and len(top_customers) > 0:
+            dcols = [c for c in ['Customer', 'Sales', 'Profit', 'Orders'] if c in top_customers.columns]
+            table, config = number_table(top_customers[dcols], {'Sales': WHOLE_DOLLARS, 'Profit': WHOLE_DOLLARS, 'Orders': 'localized'})
+            st.dataframe(table, column_config=config, use_container_width=True, height=400)
+    st.markdown("#### Loyalty")
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fig = create_order_frequency_chart(loyalty['frequency'], ORDER_FREQUENCY_LABELS)
+        if fig:
+            st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        kpi_row([
+            ("One-time Customers", f"{loyalty['one_time_customers']:,}"),
+            ("Loyal Customers (3+ orders)", f"{loyalty['loyal_customers']:,}"),
+        ])
+
+
+@st.fragment
+def returns_section(filter_opts, returns):
+    """Return metrics and the problem products chart and table."""
+    from src.charts import create_return_rate_chart
+
+    section_header("Returns", "Return Rate & Issues")
+    has_returns = filter_opts.has_returned
+    if has_returns:
+        rm = returns['metrics']
+        product_returns = returns['products']
+        kpi_row([
+            ("Total Orders", f"{rm['total_orders']:,}"),
+            ("Returned", f"{rm['returned_orders']:,}", f"{rm['return_rate']:.1f}% of orders", 'down'),
+            ("Return Rate", f"{rm['return_rate']:.1f}%"),
+            ("Lost Profit", f"${abs(rm['returned_profit_loss']):,.0f}", "from returns", 'off') if filter_opts.has_profit else ("Returned Sales", f"${rm['returned_sales']:,.0f}"),
+        ])
+        if filter_opts.has_product:
+            st.markdown("#### Problem Products")
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                top_n_r = st.slider("Show top", 5, 15, 10, key="problem_prod_slider")
+                prod_ret = product_returns.head(top_n_r) if product_returns is not None else None
+                if prod_ret is not None and len(prod_ret) > 0:
+                    fig = create_return_rate_chart(prod_ret)
+                    if fig:
+                        st.plotly_chart(fig, use_container_width=True)
+            with col2:
+                if prod_ret is not None and len(prod_ret) > 0:
+                    dcols = [c for c in ['Product', 'Total Orders', 'Returns', 'Return Rate'] if c in prod_ret.columns]
+                    table, config = number_table(prod_ret[dcols], {'Total Orders': 'localized', 'Returns': 'localized', 'Return Rate': '%.1f%%'})
+                    st.dataframe(table, column_config=config, use_container_width=True, height=400)
+    else:
+        st.markdown('<div class="info-banner"><strong>No return column in dataset.</strong><br>To see return analytics, scroll up and map a <strong>Returned</strong> column in <strong>More options</strong>. It should contain Yes/No or True/False values.</div>', unsafe_allow_html=True)
 
 
 def main():
@@ -322,42 +298,64 @@ def main():
         st.session_state.column_mapping = {}
     if 'file_name' not in st.session_state:
         st.session_state.file_name = None
-
-    st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-label">Step 1</p>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-title">Upload your data</p>', unsafe_allow_html=True)
+    if 'preview' not in st.session_state:
+        st.session_state.preview = None
+    if 'upload_id' not in st.session_state:
+        st.session_state.upload_id = None
+    if 'file_fingerprint' not in st.session_state:
+        st.session_state.file_fingerprint = None
+    if 'dtype_hints' not in st.session_state:
+        st.session_state.dtype_hints = {}
+    if 'columns' not in st.session_state:
+        st.session_state.columns = ()
+    if 'prepared' not in st.session_state:
+        st.session_state.prepared = None
+
+    section_header("Step 1", "Upload your data")
 
     uploaded_file = st.file_uploader("Drag and drop CSV or Excel", type=['csv', 'xlsx', 'xls'], help="Supports .csv, .xlsx, and .xls files")
-
-    if uploaded_file is not None:
-        try:
-            if uploaded_file.name.endswith('.csv'):
-                raw = uploaded_file.read()
-                uploaded_file.seek(0)
-                for enc in ('utf-8', 'latin-1', 'cp1252', 'iso-8859-1'):
-                    try:
-                        df = pd.read_csv(io.BytesIO(raw), encoding=enc)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    raise ValueError("Could not decode CSV. Try saving as UTF-8.")
-            else:
-                df = pd.read_excel(uploaded_file)
-            st.session_state.data = df
-            st.session_state.file_name = uploaded_file.name
-        except Exception as e:
-            st.error(f"Couldn't read file: {str(e)}")
+    max_rows = int(st.sidebar.number_input("Row limit", min_value=0, value=0, step=100_000, help="Read only the first N rows of a large file; 0 reads all of it")) or None
+
+    # Parse only when a new upload (or row limit) arrives, and skip it
+    # entirely if the dropped file has the same contents as the one loaded
+    if uploaded_file is not None and (uploaded_file.file_id, max_rows) != st.session_state.upload_id:
+        fingerprint = file_fingerprint(uploaded_file)
+        if (fingerprint, max_rows) == st.session_state.file_fingerprint:
+            st.session_state.upload_id = (uploaded_file.file_id, max_rows)
+        else:
+            try:
+                # A new version of the same file: reuse the known types of mapped columns
+                hints = None
+                if uploaded_file.name == st.session_state.file_name:
+                    mapped = set(st.session_state.column_mapping.values())
+                    hints = {c: t for c, t in st.session_state.dtype_hints.items() if c in mapped}
+                df, st.session_state.dtype_hints = load_file(uploaded_file.getvalue(), fingerprint, uploaded_file.name, column_types=hints, max_rows=max_rows)
+                table = to_table(df)
+                st.session_state.data = table
+                st.session_state.file_name = uploaded_file.name
+                # The table keeps column names as strings, which every option list uses
+                st.session_state.columns = tuple(table.column_names)
+                st.session_state.preview = table.slice(0, 10)
+                st.session_state.upload_id = (uploaded_file.file_id, max_rows)
+                st.session_state.file_fingerprint = (fingerprint, max_rows)
+            except FILE_READ_ERRORS as e:
+                st.error(f"Couldn't read file: {str(e)}")
 
     if uploaded_file is None and st.session_state.data is not None:
         name = st.session_state.get('file_name', 'Dataset')
-        rows = len(st.session_state.data)
-        cols_count = len(st.session_state.data.columns)
+        rows = st.session_state.data.num_rows
+        cols_count = len(st.session_state.columns)
         st.markdown(f'<div class="file-badge"><div class="dot"></div><div><div class="fname">{name}</div><div class="fmeta">{rows:,} rows &middot; {cols_count} columns</div></div></div>', unsafe_allow_html=True)
         if st.button("Clear & upload new"):
             st.session_state.data = None
             st.session_state.column_mapping = {}
             st.session_state.file_name = None
+            st.session_state.preview = None
+            st.session_state.upload_id = None
+            st.session_state.file_fingerprint = None
+            st.session_state.dtype_hints = {}
+            st.session_state.columns = ()
+            st.session_state.prepared = None
             st.rerun()
 
     if st.session_state.data is None:
@@ -369,251 +367,131 @@ def main():
         st.markdown('<div class="site-footer">Designed with precision. Powered by <span>Data Dash</span>.</div>', unsafe_allow_html=True)
         return
 
-    df = st.session_state.data
-    st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-label">Step 2</p>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-title">Map your columns</p>', unsafe_allow_html=True)
-    st.caption("At least **Revenue** is required. Selections are saved.")
+    df = table_to_frame(st.session_state.data)
+    section_header("Step 2", "Map your columns")
+    st.caption("At least **Revenue** is required. Press **Apply mapping** to update the dashboard.")
+
+    all_cols = st.session_state.columns
+    date_cols, numeric_cols, category_cols = detect_column_types(df, st.session_state.file_fingerprint)
+    all_opts = ("None", *all_cols)
+    num_opts = ("None", *numeric_cols)
 
-    date_cols, numeric_cols, category_cols = detect_column_types(df)
-    all_cols = df.columns.tolist()
+    # Option positions, so each selectbox default is a dict lookup rather than a list scan
+    all_pos = {c: i for i, c in enumerate(all_opts)}
+    num_pos = {c: i for i, c in enumerate(num_opts)}
 
-    def idx(col_name, opts):
+    def idx(col_name, positions):
         v = st.session_state.column_mapping.get(col_name)
-        if v and v in opts:
-            return 1 + opts.index(v)
-        return 0
+        return positions.get(v, 0) if v else 0
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.markdown("**Date**")
-        date_col = st.selectbox("Date", ["None"] + all_cols, index=idx('date', all_cols) or ((1 + all_cols.index(date_cols[0])) if date_cols and date_cols[0] in all_cols else 0), label_visibility="collapsed", key="date_col")
-        st.markdown("**Revenue** *(required)*")
-        sales_col = st.selectbox("Sales", ["None"] + numeric_cols, index=idx('sales', numeric_cols), label_visibility="collapsed", key="sales_col")
-    with col2:
-        st.markdown("**Profit**")
-        profit_col = st.selectbox("Profit", ["None"] + numeric_cols, index=idx('profit', numeric_cols), label_visibility="collapsed", key="profit_col")
-        st.markdown("**Quantity**")
-        quantity_col = st.selectbox("Quantity", ["None"] + numeric_cols, index=idx('quantity', numeric_cols), label_visibility="collapsed", key="qty_col")
-    with col3:
-        st.markdown("**Category**")
-        category_col = st.selectbox("Category", ["None"] + all_cols, index=idx('category', all_cols), label_visibility="collapsed", key="cat_col")
-        st.markdown("**Customer**")
-        customer_col = st.selectbox("Customer", ["None"] + all_cols, index=idx('customer', all_cols), label_visibility="collapsed", key="cust_col")
-
-    with st.expander("More options"):
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            order_col = st.selectbox("Order ID", ["None"] + all_cols, index=idx('order_id', all_cols), key="order_col")
-            product_col = st.selectbox("Product", ["None"] + all_cols, index=idx('product', all_cols), key="product_col")
-        with c2:
-            region_col = st.selectbox("Region", ["None"] + all_cols, index=idx('region', all_cols), key="region_col")
-            segment_col = st.selectbox("Segment", ["None"] + all_cols, index=idx('segment', all_cols), key="segment_col")
-        with c3:
-            discount_col = st.selectbox("Discount", ["None"] + numeric_cols, index=idx('discount', numeric_cols), key="discount_col")
-            returned_col = st.selectbox("Returned", ["None"] + all_cols, index=idx('returned', all_cols), key="returned_col", help="Yes/No or True/False column")
-
-    st.session_state.column_mapping = {
-        'date': None if date_col == "None" else date_col,
-        'sales': None if sales_col == "None" else sales_col,
-        'profit': None if profit_col == "None" else profit_col,
-        'quantity': None if quantity_col == "None" else quantity_col,
-        'category': None if category_col == "None" else category_col,
-        'customer': None if customer_col == "None" else customer_col,
-        'order_id': None if order_col == "None" else order_col,
-        'region': None if region_col == "None" else region_col,
-        'segment': None if segment_col == "None" else segment_col,
-        'product': None if product_col == "None" else product_col,
-        'discount': None if discount_col == "None" else discount_col,
-        'returned': None if returned_col == "None" else returned_col,
-    }
+    # One form so picking several columns costs a single rerun on submit
+    with st.form("col_mapping"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("**Date**")
+            date_col = st.selectbox("Date", all_opts, index=idx('date', all_pos) or (all_pos.get(date_cols[0], 0) if date_cols else 0), label_visibility="collapsed", key="date_col")
+            st.markdown("**Revenue** *(required)*")
+            sales_col = st.selectbox("Sales", num_opts, index=idx('sales', num_pos), label_visibility="collapsed", key="sales_col")
+        with col2:
+            st.markdown("**Profit**")
+            profit_col = st.selectbox("Profit", num_opts, index=idx('profit', num_pos), label_visibility="collapsed", key="profit_col")
+            st.markdown("**Quantity**")
+            quantity_col = st.selectbox("Quantity", num_opts, index=idx('quantity', num_pos), label_visibility="collapsed", key="qty_col")
+        with col3:
+            st.markdown("**Category**")
+            category_col = st.selectbox("Category", all_opts, index=idx('category', all_pos), label_visibility="collapsed", key="cat_col")
+            st.markdown("**Customer**")
+            customer_col = st.selectbox("Customer", all_opts, index=idx('customer', all_pos), label_visibility="collapsed", key="cust_col")
+
+        with st.expander("More options"):
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                order_col = st.selectbox("Order ID", all_opts, index=idx('order_id', all_pos), key="order_col")
+                product_col = st.selectbox("Product", all_opts, index=idx('product', all_pos), key="product_col")
+            with c2:
+                region_col = st.selectbox("Region", all_opts, index=idx('region', all_pos), key="region_col")
+                segment_col = st.selectbox("Segment", all_opts, index=idx('segment', all_pos), key="segment_col")
+            with c3:
+                discount_col = st.selectbox("Discount", num_opts, index=idx('discount', num_pos), key="discount_col")
+                returned_col = st.selectbox("Returned", all_opts, index=idx('returned', all_pos), key="returned_col", help="Yes/No or True/False column")
+        st.form_submit_button("Apply mapping")
+
+    fields = (
+        ('date', date_col), ('sales', sales_col), ('profit', profit_col),
+        ('quantity', quantity_col), ('category', category_col), ('customer', customer_col),
+        ('order_id', order_col), ('region', region_col), ('segment', segment_col),
+        ('product', product_col), ('discount', discount_col), ('returned', returned_col),
+    )
+    mapping = {k: (v if v != "None" else None) for k, v in fields}
+    # Only replace the stored mapping when a selection actually changed
+    if mapping != st.session_state.column_mapping:
+        st.session_state.column_mapping = mapping
 
     st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
 
     if st.session_state.column_mapping['sales'] is None:
         st.warning("Select at least a **Revenue** column to continue.")
-        st.dataframe(df.head(8), use_container_width=True)
+        st.dataframe(st.session_state.preview.slice(0, 8), use_container_width=True, hide_index=True)
         st.markdown('<div class="site-footer">Designed with precision. Powered by <span>Data Dash</span>.</div>', unsafe_allow_html=True)
         return
 
     st.markdown('<div class="ready-banner"><strong>Ready.</strong> <span>Scroll down for Overview, Customers & Returns.</span></div>', unsafe_allow_html=True)
 
-    prepared_df = prepare_data(df, st.session_state.column_mapping)
-    filter_opts = get_filter_options(prepared_df)
+    # Keep the prepared frame for this file and mapping in the session, so a
+    # filter change neither rehashes the raw frame nor unpickles a cached copy
+    prep_key = (st.session_state.file_fingerprint, tuple(st.session_state.column_mapping.items()))
+    if st.session_state.prepared is None or st.session_state.prepared[0] != prep_key:
+        prepared = prepare_data(df, st.session_state.column_mapping)
+        st.session_state.prepared = (prep_key, prepared, get_filter_options(prepared))
+    _, prepared_df, filter_opts = st.session_state.prepared
+    # Metrics the mapped columns support, in display order
+    metrics_avail = ('Sales',) + (('Profit',) if filter_opts.has_profit else ()) + (('Quantity',) if filter_opts.has_quantity else ())
 
     st.sidebar.markdown("### Filters")
-    if filter_opts['has_date'] and filter_opts['min_date'] is not None:
-        date_range = st.sidebar.date_input("Date Range", value=(filter_opts['min_date'], filter_opts['max_date']), min_value=filter_opts['min_date'], max_value=filter_opts['max_date'])
+    if filter_opts.has_date and filter_opts.min_date is not None:
+        date_range = st.sidebar.date_input("Date Range", value=(filter_opts.min_date, filter_opts.max_date), min_value=filter_opts.min_date, max_value=filter_opts.max_date)
         start_date, end_date = (date_range if len(date_range) == 2 else (date_range[0], date_range[0]))
     else:
         start_date = end_date = None
-    if filter_opts['has_category'] and filter_opts['categories']:
-        selected_categories = st.sidebar.multiselect("Categories", options=filter_opts['categories'], default=filter_opts['categories'])
+    if filter_opts.has_category and filter_opts.categories:
+        selected_categories = st.sidebar.multiselect("Categories", options=filter_opts.categories, default=filter_opts.categories)
     else:
         selected_categories = None
-    if filter_opts['has_region'] and filter_opts['regions']:
-        selected_regions = st.sidebar.multiselect("Regions", options=filter_opts['regions'], default=filter_opts['regions'])
+    if filter_opts.has_region and filter_opts.regions:
+        selected_regions = st.sidebar.multiselect("Regions", options=filter_opts.regions, default=filter_opts.regions)
     else:
         selected_regions = None
-    if filter_opts['has_segment'] and filter_opts['segments']:
-        selected_segments = st.sidebar.multiselect("Segments", options=filter_opts['segments'], default=filter_opts['segments'])
+    if filter_opts.has_segment and filter_opts.segments:
+        selected_segments = st.sidebar.multiselect("Segments", options=filter_opts.segments, default=filter_opts.segments)
     else:
         selected_segments = None
 
-    filtered_df = filter_data(prepared_df, start_date=start_date, end_date=end_date, categories=selected_categories, regions=selected_regions, segments=selected_segments)
+    filtered_df = filter_data(
+        prepared_df, start_date=start_date, end_date=end_date,
+        categories=narrowed(selected_categories, filter_opts.categories),
+        regions=narrowed(selected_regions, filter_opts.regions),
+        segments=narrowed(selected_segments, filter_opts.segments),
+    )
 
     if filtered_df.empty:
         st.warning("No data matches the current filters.")
         return
 
-    kpis = calculate_kpis(filtered_df, filter_opts)
-
-    # OVERVIEW
-    st.markdown('<p class="sec-label">Overview</p>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-title">Key Metrics</p>', unsafe_allow_html=True)
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Total Revenue", f"${kpis['total_sales']:,.0f}")
-    with col2:
-        if filter_opts['has_profit']:
-            st.metric("Total Profit", f"${kpis['total_profit']:,.0f}", delta=f"{kpis['profit_margin']:.1f}% margin")
-        else:
-            st.metric("Records", f"{kpis['row_count']:,}")
-    with col3:
-        if filter_opts['has_order_id']:
-            st.metric("Orders", f"{kpis['total_orders']:,}")
-        elif filter_opts['has_customer']:
-            st.metric("Customers", f"{kpis['total_customers']:,}")
-        else:
-            st.metric("Avg Value", f"${kpis['total_sales']/max(kpis['row_count'],1):,.2f}")
-    with col4:
-        if kpis['total_orders'] > 0:
-            st.metric("Avg Order Value", f"${kpis['avg_order_value']:,.2f}")
-        elif filter_opts['has_quantity']:
-            st.metric("Total Quantity", f"{kpis['total_quantity']:,.0f}")
-        else:
-            st.metric("Data Points", f"{kpis['row_count']:,}")
-
-    if filter_opts['has_date']:
-        monthly_data = calculate_monthly_metrics(filtered_df)
-        if monthly_data is not None and len(monthly_data) > 1:
-            available_metrics = [c for c in ['Sales', 'Profit', 'Quantity'] if c in monthly_data.columns]
-            if available_metrics:
-                st.markdown("#### Trends")
-                tabs = st.tabs(available_metrics)
-                for i, metric in enumerate(available_metrics):
-                    with tabs[i]:
-                        fig = create_monthly_trend_chart(monthly_data, metric)
-                        if fig:
-                            st.plotly_chart(fig, use_container_width=True)
-
-    breakdown_cols = []
-    if filter_opts['has_category']:
-        breakdown_cols.append(('Category', get_category_breakdown(filtered_df)))
-    if filter_opts['has_region']:
-        breakdown_cols.append(('Region', get_region_breakdown(filtered_df)))
-    if breakdown_cols:
-        st.markdown("#### Breakdown")
-        cols = st.columns(len(breakdown_cols))
-        for i, (name, data) in enumerate(breakdown_cols):
-            with cols[i]:
-                if data is not None and len(data) > 0:
-                    view = st.radio(f"{name}", ["Bar", "Pie"], horizontal=True, key=f"{name}_view")
-                    fig = create_category_chart(data, 'pie' if view == "Pie" else 'bar')
-                    if fig:
-                        st.plotly_chart(fig, use_container_width=True)
-
-    if filter_opts['has_product']:
-        st.markdown("#### Top Products")
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            top_n = st.slider("Show top", 5, 20, 10, key="top_prod_slider")
-            metrics_avail = ['Sales'] + (['Profit'] if filter_opts['has_profit'] else []) + (['Quantity'] if filter_opts['has_quantity'] else [])
-            metric_choice = st.radio("Rank by", metrics_avail, horizontal=True, key="product_metric")
-            top_products = get_top_items(filtered_df, '_product', n=top_n, by=metric_choice)
-            if top_products is not None:
-                fig = create_top_items_chart(top_products, metric_choice)
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
-        with col2:
-            if top_products is not None:
-                dcols = [c for c in ['Name', 'Sales', 'Profit', 'Quantity'] if c in top_products.columns]
-                fmt = {'Sales': '${:,.0f}', 'Profit': '${:,.0f}', 'Quantity': '{:,.0f}'}
-                st.dataframe(top_products[dcols].style.format({k: v for k, v in fmt.items() if k in dcols}), use_container_width=True, height=400)
-
-    # CUSTOMERS
-    if filter_opts['has_customer']:
-        st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
-        st.markdown('<p class="sec-label">Customers</p>', unsafe_allow_html=True)
-        st.markdown('<p class="sec-title">Buyers & Loyalty</p>', unsafe_allow_html=True)
-        total_customers, repeat_customers, repeat_rate = calculate_repeat_customers(filtered_df)
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Customers", f"{total_customers:,}")
-        with col2:
-            st.metric("Repeat Customers", f"{repeat_customers:,}", delta=f"{repeat_rate:.1f}%")
-        with col3:
-            st.metric("Avg Revenue / Customer", f"${kpis['total_sales']/max(total_customers,1):,.0f}")
-        with col4:
-            if filter_opts['has_order_id']:
-                st.metric("Avg Orders / Customer", f"{kpis['total_orders']/max(total_customers,1):.1f}")
-            else:
-                st.metric("Total Revenue", f"${kpis['total_sales']:,.0f}")
-        st.markdown("#### Top Customers")
-        col1, col2 = st.columns([2, 1])
-        with col1:
-            top_n_c = st.slider("Show top", 5, 20, 10, key="top_cust_slider")
-            top_customers = get_top_customers(filtered_df, n=top_n_c)
-            if top_customers is not None and len(top_customers) > 0:
-                fig = create_customers_chart(top_customers)
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
-        with col2:
-            if top_customers is not None and len(top_customers) > 0:
-                dcols = [c for c in ['Customer', 'Sales', 'Profit', 'Orders'] if c in top_customers.columns]
-                fmt = {'Sales': '${:,.0f}', 'Profit': '${:,.0f}', 'Orders': '{:,}'}
-                st.dataframe(top_customers[dcols].style.format({k: v for k, v in fmt.items() if k in dcols}), use_container_width=True, height=400)
-
-    # RETURNS
-    st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-label">Returns</p>', unsafe_allow_html=True)
-    st.markdown('<p class="sec-title">Return Rate & Issues</p>', unsafe_allow_html=True)
-    has_returns = filter_opts['has_returned']
-    if has_returns:
-        rm = get_return_metrics(filtered_df)
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Orders", f"{rm['total_orders']:,}")
-        with col2:
-            st.metric("Returned", f"{rm['returned_orders']:,}", delta=f"-{rm['return_rate']:.1f}%", delta_color="inverse")
-        with col3:
-            st.metric("Return Rate", f"{rm['return_rate']:.1f}%")
-        with col4:
-            if filter_opts['has_profit']:
-                st.metric("Lost Profit", f"${abs(rm['returned_profit_loss']):,.0f}", delta="from returns", delta_color="off")
-            else:
-                st.metric("Returned Sales", f"${rm['returned_sales']:,.0f}")
-        if filter_opts['has_product']:
-            st.markdown("#### Problem Products")
-            col1, col2 = st.columns([2, 1])
-            with col1:
-                top_n_r = st.slider("Show top", 5, 15, 10, key="problem_prod_slider")
-                prod_ret = get_items_by_return_rate(filtered_df, '_product', 'Product', n=top_n_r)
-                if prod_ret is not None and len(prod_ret) > 0:
-                    fig = create_return_rate_chart(prod_ret)
-                    if fig:
-                        st.plotly_chart(fig, use_container_width=True)
-            with col2:
-                if prod_ret is not None and len(prod_ret) > 0:
-                    dcols = [c for c in ['Product', 'Total Orders', 'Returns', 'Return Rate'] if c in prod_ret.columns]
-                    fmt = {'Total Orders': '{:,}', 'Returns': '{:,}', 'Return Rate': '{:.1f}%'}
-                    st.dataframe(prod_ret[dcols].style.format({k: v for k, v in fmt.items() if k in dcols}), use_container_width=True, height=400)
-    else:
-        st.markdown('<div class="info-banner"><strong>No return column in dataset.</strong><br>To see return analytics, scroll up and map a <strong>Returned</strong> column in <strong>More options</strong>. It should contain Yes/No or True/False values.</div>', unsafe_allow_html=True)
-
-    st.markdown('<div class="sep"></div>', unsafe_allow_html=True)
-    st.markdown("#### Data Preview")
-    st.dataframe(df.head(10), use_container_width=True)
+    sections = calculate_sections(filtered_df, filter_opts)
+    kpis = sections['kpis']
+
+    # Each section is a fragment, so its sliders and radios rerun only that
+    # section; the aggregations above are computed once and handed in
+    breakdown_cols = [(name, sections[key]) for name, key in (('Category', 'category'), ('Region', 'region')) if getattr(filter_opts, f'has_{key}')]
+    overview_section(filter_opts, kpis, metrics_avail, sections['monthly'], breakdown_cols, sections['products'])
+    if filter_opts.has_customer:
+        customers_section(filter_opts, kpis, sections['loyalty'], sections['customers'])
+    returns_section(filter_opts, sections['returns'])
+
+    st.markdown('<div class="sep"></div>\n\n#### Data Preview', unsafe_allow_html=True)
+    # Only the mapped columns, selected from the stored Arrow slice without copying
+    preview_cols = list(dict.fromkeys(str(c) for c in st.session_state.column_mapping.values() if c))
+    st.dataframe(st.session_state.preview.select(preview_cols), use_container_width=True, hide_index=True)
     st.markdown('<div class="site-footer">Designed with precision. Powered by <span>Data Dash</span>.</div>', unsafe_allow_html=True)
 
 
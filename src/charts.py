@@ -3,6 +3,7 @@ Chart creation functions for Data Dash.
 Professional, clean visualizations.
 """
 
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
@@ -37,12 +38,52 @@ CHART_TEMPLATE = {
     }
 }
 
+# Light to dark, one per order-frequency bin
+FREQUENCY_COLORS = ['#e9d5ff', '#d8b4fe', '#c084fc', '#a855f7', '#7e22ce']
+
+# Most points a line trace is given; longer series are downsampled first
+MAX_LINE_POINTS = 1000
+
+
+def _lttb(y: np.ndarray, target: int) -> np.ndarray:
+    """
+    Pick `target` row positions that preserve the visual shape of a series.
+    
+    Largest-Triangle-Three-Buckets: the first and last points are kept,
+    the rest are split into equal buckets, and each bucket keeps the point
+    forming the largest triangle with the previous pick and the mean of
+    the next bucket.
+    """
+    n = len(y)
+    if n <= target or target < 3:
+        return np.arange(n)
+    
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, target - 1).astype(int)
+    picked = np.empty(target, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(target - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < target - 1 else (n - 1, n)
+        mx, my = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - mx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (my - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    
+    return picked
+
 
 def create_monthly_trend_chart(monthly_df: pd.DataFrame, metric: str = 'Sales') -> Optional[go.Figure]:
     """Create a monthly trend line chart."""
     if monthly_df is None or metric not in monthly_df.columns:
         return None
     
+    if len(monthly_df) > MAX_LINE_POINTS:
+        keep = _lttb(monthly_df[metric].to_numpy(dtype=float), MAX_LINE_POINTS)
+        monthly_df = monthly_df.iloc[keep]
+    
     fig = px.line(
         monthly_df,
         x='Month',
@@ -230,6 +271,29 @@ def create_customers_chart(df: pd.DataFrame) -> Optional[go.Figure]:
     return fig
 
 
+def create_order_frequency_chart(frequency: np.ndarray, labels) -> Optional[go.Figure]:
+    """Create a bar chart of customers per order-frequency bin."""
+    if frequency is None or frequency.sum() == 0:
+        return None
+    
+    # Five fixed bars: a plain trace skips plotly express building a frame
+    # and a continuous colour axis for them
+    fig = go.Figure(go.Bar(
+        x=list(labels),
+        y=frequency,
+        marker_color=FREQUENCY_COLORS[:len(frequency)]
+    ), layout_title_text='Customer Order Frequency')
+    
+    fig.update_layout(
+        xaxis_title='Orders per Customer',
+        yaxis_title='Customers',
+        showlegend=False,
+        **CHART_TEMPLATE['layout']
+    )
+    
+    return fig
+
+
 def create_return_rate_chart(df: pd.DataFrame) -> Optional[go.Figure]:
     """Create a return rate bar chart."""
     if df is None or 'Return Rate' not in df.columns:
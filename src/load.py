@@ -3,9 +3,318 @@ Data loading and preprocessing for Data Dash.
 Handles dynamic column mapping for any dataset.
 """
 
+import codecs
+import hashlib
+import io
+import zipfile
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
+from charset_normalizer import from_bytes
+from charset_normalizer.utils import is_multi_byte_encoding
 from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    from python_calamine import CalamineError
+except ImportError:
+    class CalamineError(Exception):
+        """Stand-in when python-calamine is not installed; never raised."""
+
+try:
+    from xlrd import XLRDError
+except ImportError:
+    class XLRDError(Exception):
+        """Stand-in when xlrd is not installed; never raised."""
+
+
+# What a malformed or mis-encoded upload can raise; anything else is a bug
+FILE_READ_ERRORS = (UnicodeDecodeError, pd.errors.ParserError, ValueError, zipfile.BadZipFile, CalamineError, XLRDError)
+
+
+def file_fingerprint(uploaded_file: io.BytesIO) -> str:
+    """
+    Identify an upload by its name and contents.
+    
+    BLAKE2b runs at memory speed, so this costs a small fraction of a
+    parse and lets a re-dropped file be recognised without parsing it
+    again. getvalue() hands back the upload's own bytes without copying.
+    """
+    digest = hashlib.blake2b(uploaded_file.name.encode('utf-8'), digest_size=16)
+    digest.update(uploaded_file.getvalue())
+    return digest.hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_file(_raw: bytes, fingerprint: str, file_name: str, column_types: dict = None, max_rows: int = None) -> tuple:
+    """
+    Parse an uploaded CSV or Excel file and shrink its dtypes.
+    
+    Cached on the file's fingerprint, so a rerun or re-upload with the
+    same bytes returns the finished frame without decoding or downcasting
+    it again. The bytes themselves are left out of the cache key; the
+    caller has already hashed them once with BLAKE2b. Only the last few
+    files are kept, and nothing is written to disk.
+    
+    Args:
+        _raw: Raw file contents (not hashed by the cache)
+        fingerprint: file_fingerprint() of the upload
+        file_name: Original file name, used to pick the parser
+        column_types: Optional pyarrow type hints for CSV columns
+        max_rows: Optional cap on the rows read
+    
+    Returns:
+        tuple: (DataFrame with narrowed dtypes, {column: pyarrow type} as parsed)
+    """
+    if file_name.endswith('.csv'):
+        df = read_csv_file(_raw, column_types, max_rows)
+    else:
+        df = read_excel_file(_raw, file_name, max_rows)
+    # Hints describe the file as parsed, before downcasting narrows them
+    arrow_types = get_arrow_types(df)
+    return downcast_dtypes(df), arrow_types
+
+
+SNIFF_BYTES = 1 << 16
+
+# charset-normalizer has little to go on in a mostly-ASCII CSV and scores
+# single-byte codepages (cp1250, cp775, cp1006...) almost alike, so only a
+# confident multi-byte guess, such as UTF-16 or Shift JIS, is taken
+MAX_SNIFF_CHAOS = 0.1
+
+# Bytes with no character in cp1252; a file using them is read as latin-1
+CP1252_UNDEFINED = (b'\x81', b'\x8d', b'\x8f', b'\x90', b'\x9d')
+
+
+def sniff_encoding(raw: bytes) -> str:
+    """
+    Pick a file's text encoding from its first 64 KB.
+    
+    A sample that is valid UTF-8 (including pure ASCII) is read as UTF-8.
+    Otherwise charset-normalizer's guess is used only when it is confident
+    and multi-byte; any other file is taken to be Western single-byte text.
+    """
+    sample = raw[:SNIFF_BYTES]
+    try:
+        # Not final: a character cut off at the end of the sample is fine
+        codecs.utf_8_decode(sample, 'strict', False)
+        return 'utf8'
+    except UnicodeDecodeError:
+        pass
+    match = from_bytes(sample).best()
+    if match is not None and match.chaos <= MAX_SNIFF_CHAOS and is_multi_byte_encoding(match.encoding):
+        return match.encoding
+    return single_byte_encoding(raw)
+
+
+def single_byte_encoding(raw: bytes) -> str:
+    """
+    cp1252, unless the file uses a byte cp1252 leaves undefined.
+    
+    Latin-1 is the last resort: it maps every byte, so the read cannot
+    fail. Each check is a byte search, not a decode of the file.
+    """
+    if any(byte in raw for byte in CP1252_UNDEFINED):
+        return 'latin1'
+    return 'cp1252'
+
+
+def _read_arrow_csv(buffer: pa.Buffer, read_options, convert_options=None, max_rows: int = None) -> pd.DataFrame:
+    """
+    Parse a CSV buffer with pyarrow, stopping early once `max_rows` are read.
+    
+    Uncapped reads use the multithreaded reader. A capped read streams
+    record batches instead, so the rest of a huge file is never parsed.
+    """
+    if not max_rows:
+        table = pacsv.read_csv(pa.BufferReader(buffer), read_options=read_options, convert_options=convert_options)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    
+    reader = pacsv.open_csv(pa.BufferReader(buffer), read_options=read_options, convert_options=convert_options)
+    batches, total = [], 0
+    for batch in reader:
+        batches.append(batch)
+        total += batch.num_rows
+        if total >= max_rows:
+            break
+    table = pa.Table.from_batches(batches, schema=reader.schema).slice(0, max_rows)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _has_binary_columns(df: pd.DataFrame) -> bool:
+    """Check for Arrow binary columns, which is how pyarrow keeps text that is not valid UTF-8."""
+    return any(
+        isinstance(dtype, pd.ArrowDtype) and (pa.types.is_binary(dtype.pyarrow_dtype) or pa.types.is_large_binary(dtype.pyarrow_dtype))
+        for dtype in df.dtypes
+    )
+
+
+def read_csv_file(raw: bytes, column_types: dict = None, max_rows: int = None) -> pd.DataFrame:
+    """
+    Parse CSV bytes into an Arrow-backed DataFrame.
+    
+    The encoding is sniffed once from a sample, then pyarrow's
+    multithreaded reader parses the bytes in place through a zero-copy
+    buffer. Files pyarrow rejects, such as quoted newlines or ragged rows,
+    fall back to a single C-engine pass with the same encoding. A file
+    whose sample looked like UTF-8 but whose later bytes are not is read
+    again as Western single-byte text.
+    
+    Args:
+        raw: Raw file contents
+        column_types: Optional {column: pyarrow type} hints that skip type
+            inference for those columns; ignored if the file disagrees
+        max_rows: Optional cap; parsing stops once this many rows are read
+    
+    Returns:
+        pd.DataFrame: Parsed data with pyarrow dtypes
+    """
+    encoding = sniff_encoding(raw)
+    df = _parse_csv(raw, encoding, column_types, max_rows)
+    # pyarrow does not raise on invalid UTF-8; it infers those columns as binary
+    if encoding == 'utf8' and _has_binary_columns(df):
+        df = _parse_csv(raw, single_byte_encoding(raw), column_types, max_rows)
+    return df
+
+
+def _parse_csv(raw: bytes, encoding: str, column_types: dict = None, max_rows: int = None) -> pd.DataFrame:
+    """Parse CSV bytes with a known encoding: pyarrow first, the C engine if pyarrow rejects the file."""
+    buffer = pa.py_buffer(raw)
+    read_options = pacsv.ReadOptions(encoding=encoding)
+    
+    if column_types:
+        try:
+            return _read_arrow_csv(buffer, read_options, pacsv.ConvertOptions(column_types=column_types), max_rows)
+        except (pa.ArrowInvalid, UnicodeDecodeError):
+            pass
+    
+    try:
+        return _read_arrow_csv(buffer, read_options, max_rows=max_rows)
+    except (pa.ArrowInvalid, UnicodeDecodeError):
+        pass
+    
+    return pd.read_csv(io.BytesIO(raw), encoding=encoding, encoding_errors='replace', low_memory=False, dtype_backend='pyarrow', nrows=max_rows)
+
+
+def get_arrow_types(df: pd.DataFrame) -> dict:
+    """Map each Arrow-backed column to its pyarrow type, for use as read hints."""
+    return {col: dtype.pyarrow_dtype for col, dtype in df.dtypes.items() if isinstance(dtype, pd.ArrowDtype)}
+
+
+# Fallback engines for when python-calamine is missing or rejects a workbook
+EXCEL_ENGINES = {'.xlsx': 'openpyxl', '.xls': 'xlrd'}
+
+
+def read_excel_file(raw: bytes, file_name: str, max_rows: int = None) -> pd.DataFrame:
+    """
+    Parse an uploaded workbook into an Arrow-backed DataFrame.
+    
+    Tries calamine first, which parses both .xlsx and .xls in native code
+    and is several times faster than openpyxl on large sheets. Falls back
+    to the pure-Python engine picked from the extension. pandas already
+    opens workbooks read-only, so with a row cap the sheet is only walked
+    as far as needed.
+    
+    Args:
+        raw: Raw file contents
+        file_name: Original file name, used to pick the fallback engine
+        max_rows: Optional cap on the data rows read
+    
+    Returns:
+        pd.DataFrame: First sheet with pyarrow dtypes
+    """
+    try:
+        return pd.read_excel(io.BytesIO(raw), engine='calamine', dtype_backend='pyarrow', nrows=max_rows)
+    except (ImportError, CalamineError):
+        pass
+    
+    engine = EXCEL_ENGINES.get(Path(file_name).suffix.lower(), 'openpyxl')
+    return pd.read_excel(io.BytesIO(raw), engine=engine, dtype_backend='pyarrow', nrows=max_rows)
+
+
+DOWNCAST_MIN_ROWS = 50_000
+CARDINALITY_SAMPLE = 10_000
+
+
+def _low_cardinality(series: pd.Series, ratio: float = 0.5) -> bool:
+    """
+    Check whether under `ratio` of a column's values are unique.
+    
+    ID-like columns are rejected from the first rows before paying for a
+    full-column distinct count.
+    """
+    sample = series.iloc[:CARDINALITY_SAMPLE]
+    if sample.nunique() >= ratio * len(sample):
+        return False
+    return series.nunique() < ratio * len(series)
+
+
+def downcast_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink a freshly loaded frame's memory footprint.
+    
+    Integer columns are downcast to the smallest dtype that holds their
+    values and text columns with fewer than 50% unique values become
+    categoricals. Floats keep 64 bits, since float32 loses cents on
+    revenue-sized sums. Small frames are returned untouched since the
+    scan would cost more than it saves.
+    
+    Args:
+        df: Raw dataframe, modified in place
+    
+    Returns:
+        pd.DataFrame: The same dataframe with narrower dtypes
+    """
+    if len(df) <= DOWNCAST_MIN_ROWS:
+        return df
+    
+    for col, dtype in zip(df.columns, df.dtypes.values):
+        kind = dtype.kind
+        if kind == 'i':
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif kind == 'u':
+            df[col] = pd.to_numeric(df[col], downcast='unsigned')
+        elif kind in 'OU' and _low_cardinality(df[col]):
+            df[col] = df[col].astype('category')
+    
+    return df
+
+
+def _numpy_backed(series: pd.Series) -> pd.Series:
+    """Convert an Arrow-backed series to its NumPy equivalent (no-op otherwise)."""
+    if isinstance(series.dtype, pd.ArrowDtype):
+        return series.astype(series.dtype.numpy_dtype)
+    return series
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Freeze a loaded frame as an Arrow table for session storage.
+    
+    A table keeps strings in contiguous buffers instead of one Python
+    object per cell, and categoricals become dictionary arrays.
+    """
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def _arrow_dtype(arrow_type: pa.DataType):
+    """Wrap Arrow types in ArrowDtype, leaving dictionaries to become Categoricals."""
+    if pa.types.is_dictionary(arrow_type):
+        return None
+    return pd.ArrowDtype(arrow_type)
+
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+    """
+    View a stored Arrow table as a DataFrame.
+    
+    Arrow-backed columns wrap the table's buffers rather than copying
+    them, so this is cheap enough to run on every rerun.
+    """
+    return table.to_pandas(types_mapper=_arrow_dtype)
 
 
 def get_data_and_mapping():
@@ -21,9 +330,10 @@ def get_data_and_mapping():
     if 'column_mapping' not in st.session_state:
         return None, None
     
-    return st.session_state.data.copy(), st.session_state.column_mapping
+    return table_to_frame(st.session_state.data), st.session_state.column_mapping
 
 
+@st.cache_data(show_spinner=False, max_entries=4)
 def prepare_data(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
     """
     Prepare data based on column mapping.
@@ -34,49 +344,58 @@ def prepare_data(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
         mapping: Column mapping dictionary
     
     Returns:
-        pd.DataFrame: Prepared dataframe with standardized columns
+        pd.DataFrame: Prepared dataframe with standardized columns,
+            sorted by _date (missing dates last) when a date is mapped
     """
     prepared = df.copy()
     
     # Parse date column if specified
     if mapping.get('date'):
         try:
-            prepared['_date'] = pd.to_datetime(prepared[mapping['date']], errors='coerce')
+            # Offset-suffixed timestamps are parsed in UTC and kept as naive
+            # UTC, so the date filter can compare them with plain dates
+            dates = pd.to_datetime(prepared[mapping['date']], errors='coerce', utc=True)
+            prepared['_date'] = _numpy_backed(dates.dt.tz_convert(None))
             prepared['_year'] = prepared['_date'].dt.year
             prepared['_month'] = prepared['_date'].dt.month
             prepared['_year_month'] = prepared['_date'].dt.to_period('M').astype(str)
             prepared['_quarter'] = prepared['_date'].dt.quarter
-        except Exception:
+        except (ValueError, TypeError):
             pass
     
-    # Standardize numeric columns
+    # Standardize numeric columns. Measures are summed with NumPy, which
+    # accumulates in the input dtype, so they are always float64 here
+    # whatever narrower dtype the loader picked
     if mapping.get('sales'):
-        prepared['_sales'] = pd.to_numeric(prepared[mapping['sales']], errors='coerce').fillna(0)
+        prepared['_sales'] = pd.to_numeric(prepared[mapping['sales']], errors='coerce').fillna(0).astype(np.float64)
     
     if mapping.get('profit'):
-        prepared['_profit'] = pd.to_numeric(prepared[mapping['profit']], errors='coerce').fillna(0)
+        prepared['_profit'] = pd.to_numeric(prepared[mapping['profit']], errors='coerce').fillna(0).astype(np.float64)
     
     if mapping.get('quantity'):
-        prepared['_quantity'] = pd.to_numeric(prepared[mapping['quantity']], errors='coerce').fillna(0)
+        prepared['_quantity'] = pd.to_numeric(prepared[mapping['quantity']], errors='coerce').fillna(0).astype(np.float64)
     
     if mapping.get('discount'):
-        prepared['_discount'] = pd.to_numeric(prepared[mapping['discount']], errors='coerce').fillna(0)
+        prepared['_discount'] = pd.to_numeric(prepared[mapping['discount']], errors='coerce').fillna(0).astype(np.float64)
     
-    # Standardize category columns
+    # Standardize category columns. Dimensions with few distinct values are
+    # stored as categoricals, so filters and groupbys work on integer codes
     if mapping.get('category'):
-        prepared['_category'] = prepared[mapping['category']].astype(str)
+        prepared['_category'] = prepared[mapping['category']].astype(str).astype('category')
     
     if mapping.get('customer'):
-        prepared['_customer'] = prepared[mapping['customer']].astype(str)
+        # Many rows per customer: categorical codes make every later
+        # factorize a read of the codes rather than a string hash per row
+        prepared['_customer'] = prepared[mapping['customer']].astype(str).astype('category')
     
     if mapping.get('order_id'):
         prepared['_order_id'] = prepared[mapping['order_id']].astype(str)
     
     if mapping.get('region'):
-        prepared['_region'] = prepared[mapping['region']].astype(str)
+        prepared['_region'] = prepared[mapping['region']].astype(str).astype('category')
     
     if mapping.get('segment'):
-        prepared['_segment'] = prepared[mapping['segment']].astype(str)
+        prepared['_segment'] = prepared[mapping['segment']].astype(str).astype('category')
     
     if mapping.get('product'):
         prepared['_product'] = prepared[mapping['product']].astype(str)
@@ -86,9 +405,42 @@ def prepare_data(df: pd.DataFrame, mapping: dict) -> pd.DataFrame:
         col = mapping['returned']
         prepared['_returned'] = prepared[col].astype(str).str.lower().isin(['yes', 'true', '1', 'returned'])
     
+    # Date order lets filter_data cut a date range with a binary search
+    if '_date' in prepared.columns:
+        prepared = prepared.sort_values('_date', kind='stable', na_position='last', ignore_index=True)
+    
     return prepared
 
 
+def _date_slice(df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    """Rows of a date-sorted frame within [start_date, end_date]; missing dates are dropped."""
+    dates = df['_date'].to_numpy()
+    # NumPy orders NaT after every date, for sorting and searching alike,
+    # so the missing dates form a tail that starts at the NaT position
+    hi = np.searchsorted(dates, np.datetime64('NaT'), side='left')
+    lo = 0
+    if start_date is not None:
+        lo = np.searchsorted(dates[:hi], pd.to_datetime(start_date).to_datetime64(), side='left')
+    if end_date is not None:
+        hi = np.searchsorted(dates[:hi], pd.to_datetime(end_date).to_datetime64(), side='right')
+    return df.iloc[lo:hi]
+
+
+def _isin(series: pd.Series, values) -> np.ndarray:
+    """
+    Boolean mask of the rows whose value is in `values`.
+    
+    For a categorical the selection is matched against the categories
+    once, then the per-row mask is a gather through the integer codes.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # The trailing False is what code -1 (a missing value) picks up
+        selected = np.append(series.cat.categories.isin(values), False)
+        return selected[series.cat.codes.to_numpy()]
+    return series.isin(values).to_numpy()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
 def filter_data(
     df: pd.DataFrame,
     start_date=None,
@@ -100,68 +452,98 @@ def filter_data(
     """
     Filter the dataframe based on user selections.
     Uses standardized column names (prefixed with _).
-    """
-    filtered = df.copy()
     
+    Cached on the frame and the selections, so toggling back to an
+    earlier combination of filters skips the scan.
+    
+    The frame from prepare_data is sorted by date, so the date range is
+    cut as a contiguous slice found by binary search, and the remaining
+    filters only scan the rows inside it.
+    """
     # Date filtering
-    if start_date is not None and '_date' in filtered.columns:
-        start_dt = pd.to_datetime(start_date)
-        filtered = filtered[filtered['_date'] >= start_dt]
+    if (start_date is not None or end_date is not None) and '_date' in df.columns:
+        df = _date_slice(df, start_date, end_date)
+    
+    # With nothing narrowed (the default), skip the mask and the gather
+    if not (categories or regions or segments):
+        return df
     
-    if end_date is not None and '_date' in filtered.columns:
-        end_dt = pd.to_datetime(end_date)
-        filtered = filtered[filtered['_date'] <= end_dt]
+    # Every other condition is folded into one boolean mask and the rows
+    # are gathered once, instead of copying the frame for each filter
+    mask = np.ones(len(df), dtype=bool)
     
     # Category filtering
-    if categories and len(categories) > 0 and '_category' in filtered.columns:
-        filtered = filtered[filtered['_category'].isin(categories)]
+    if categories and '_category' in df.columns:
+        mask &= _isin(df['_category'], categories)
     
-    if regions and len(regions) > 0 and '_region' in filtered.columns:
-        filtered = filtered[filtered['_region'].isin(regions)]
+    if regions and '_region' in df.columns:
+        mask &= _isin(df['_region'], regions)
     
-    if segments and len(segments) > 0 and '_segment' in filtered.columns:
-        filtered = filtered[filtered['_segment'].isin(segments)]
+    if segments and '_segment' in df.columns:
+        mask &= _isin(df['_segment'], segments)
     
-    return filtered
+    return df[mask]
+
+
+def _unique_sorted(series: pd.Series) -> tuple:
+    """Distinct non-null values of a column, sorted, as an immutable tuple."""
+    return tuple(sorted(series.dropna().unique().tolist()))
 
 
-def get_filter_options(df: pd.DataFrame) -> dict:
+class FilterOpts(NamedTuple):
+    """What the prepared frame supports: filter choices and has_* flags per mapped column."""
+    min_date: Optional[pd.Timestamp]
+    max_date: Optional[pd.Timestamp]
+    categories: Tuple[str, ...]
+    regions: Tuple[str, ...]
+    segments: Tuple[str, ...]
+    has_date: bool
+    has_category: bool
+    has_region: bool
+    has_segment: bool
+    has_profit: bool
+    has_quantity: bool
+    has_customer: bool
+    has_order_id: bool
+    has_product: bool
+    has_returned: bool
+    has_discount: bool
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def get_filter_options(df: pd.DataFrame) -> FilterOpts:
     """
     Get unique values for filter dropdowns.
     Uses standardized column names.
+    
+    Cached per prepared frame, so the distinct-value scans run once per
+    dataset and mapping rather than on every filter change. Returned as
+    an immutable tuple, so downstream cache keys hash it cheaply.
     """
-    options = {
-        'min_date': None,
-        'max_date': None,
-        'categories': [],
-        'regions': [],
-        'segments': [],
-        'has_date': '_date' in df.columns,
-        'has_category': '_category' in df.columns,
-        'has_region': '_region' in df.columns,
-        'has_segment': '_segment' in df.columns,
-        'has_profit': '_profit' in df.columns,
-        'has_quantity': '_quantity' in df.columns,
-        'has_customer': '_customer' in df.columns,
-        'has_order_id': '_order_id' in df.columns,
-        'has_product': '_product' in df.columns,
-        'has_returned': '_returned' in df.columns,
-        'has_discount': '_discount' in df.columns,
-    }
-    
-    if '_date' in df.columns:
+    columns = df.columns
+    
+    min_date = max_date = None
+    if '_date' in columns:
         valid_dates = df['_date'].dropna()
         if len(valid_dates) > 0:
-            options['min_date'] = valid_dates.min()
-            options['max_date'] = valid_dates.max()
-    
-    if '_category' in df.columns:
-        options['categories'] = sorted(df['_category'].dropna().unique().tolist())
-    
-    if '_region' in df.columns:
-        options['regions'] = sorted(df['_region'].dropna().unique().tolist())
-    
-    if '_segment' in df.columns:
-        options['segments'] = sorted(df['_segment'].dropna().unique().tolist())
+            min_date = valid_dates.min()
+            max_date = valid_dates.max()
     
-    return options
+    return FilterOpts(
+        min_date=min_date,
+        max_date=max_date,
+        categories=_unique_sorted(df['_category']) if '_category' in columns else (),
+        regions=_unique_sorted(df['_region']) if '_region' in columns else (),
+        segments=_unique_sorted(df['_segment']) if '_segment' in columns else (),
+        has_date='_date' in columns,
+        has_category='_category' in columns,
+        has_region='_region' in columns,
+        has_segment='_segment' in columns,
+        has_profit='_profit' in columns,
+        has_quantity='_quantity' in columns,
+        has_customer='_customer' in columns,
+        has_order_id='_order_id' in columns,
+        has_product='_product' in columns,
+        has_returned='_returned' in columns,
+        has_discount='_discount' in columns,
+    )
@@ -3,17 +3,23 @@ Business metrics calculations for Data Dash.
 Uses standardized column names (prefixed with _).
 """
 
+import numpy as np
 import pandas as pd
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
 
 
-def calculate_kpis(df: pd.DataFrame, options: dict) -> dict:
+def calculate_kpis(df: pd.DataFrame, options) -> dict:
     """
     Calculate key performance indicators.
     
+    Not cached itself: calculate_sections caches it with the rest, so
+    the frame is hashed once.
+    
     Args:
         df: Prepared dataframe with standardized columns
-        options: Filter options dict with has_* flags
+        options: FilterOpts from get_filter_options
     
     Returns:
         dict: Dictionary of KPI values
@@ -27,6 +33,9 @@ def calculate_kpis(df: pd.DataFrame, options: dict) -> dict:
         'avg_order_value': 0,
         'profit_margin': 0,
         'avg_discount': 0,
+        'avg_value_per_row': 0,
+        'avg_revenue_per_customer': 0,
+        'avg_orders_per_customer': 0,
         'row_count': len(df)
     }
     
@@ -55,6 +64,14 @@ def calculate_kpis(df: pd.DataFrame, options: dict) -> dict:
     if '_discount' in df.columns:
         kpis['avg_discount'] = df['_discount'].mean() * 100
     
+    # Derived ratios, so the page only has to format them
+    if kpis['row_count'] > 0:
+        kpis['avg_value_per_row'] = kpis['total_sales'] / kpis['row_count']
+    
+    if kpis['total_customers'] > 0:
+        kpis['avg_revenue_per_customer'] = kpis['total_sales'] / kpis['total_customers']
+        kpis['avg_orders_per_customer'] = kpis['total_orders'] / kpis['total_customers']
+    
     return kpis
 
 
@@ -62,31 +79,36 @@ def calculate_monthly_metrics(df: pd.DataFrame) -> Optional[pd.DataFrame]:
     """
     Calculate monthly aggregated metrics.
     
+    Rows are put in date order (a near no-op for date-sorted files) so each
+    month is one contiguous run, and every measure is summed per run with
+    np.add.reduceat instead of building a hashed groupby.
+    
     Returns:
         pd.DataFrame or None if no date column
     """
-    if '_year_month' not in df.columns or '_sales' not in df.columns:
+    if '_year_month' not in df.columns or '_sales' not in df.columns or df.empty:
         return None
     
-    agg_dict = {'_sales': 'sum'}
+    order = np.argsort(df['_date'].to_numpy(), kind='stable')
+    months = df['_year_month'].to_numpy()[order]
+    starts = np.r_[0, np.flatnonzero(months[1:] != months[:-1]) + 1]
+    
+    monthly = pd.DataFrame({'Month': months[starts]})
+    monthly['Sales'] = np.add.reduceat(df['_sales'].to_numpy()[order], starts)
     
     if '_profit' in df.columns:
-        agg_dict['_profit'] = 'sum'
+        monthly['Profit'] = np.add.reduceat(df['_profit'].to_numpy()[order], starts)
     
     if '_order_id' in df.columns:
-        agg_dict['_order_id'] = 'nunique'
+        month_codes = np.zeros(len(order), dtype=np.int64)
+        month_codes[starts[1:]] = 1
+        month_codes = np.cumsum(month_codes)
+        monthly['Orders'] = _distinct_per_group(month_codes, len(starts), df['_order_id'].iloc[order])
     
     if '_quantity' in df.columns:
-        agg_dict['_quantity'] = 'sum'
-    
-    monthly = df.groupby('_year_month').agg(agg_dict).reset_index()
+        monthly['Quantity'] = np.add.reduceat(df['_quantity'].to_numpy()[order], starts)
     
-    # Rename columns for display
-    monthly.columns = ['Month'] + [c.replace('_', '').title() for c in monthly.columns[1:]]
-    if 'Order Id' in monthly.columns:
-        monthly = monthly.rename(columns={'Order Id': 'Orders'})
-    
-    monthly = monthly.sort_values('Month')
+    monthly = monthly.sort_values('Month', ignore_index=True)
     
     # Calculate changes
     if 'Sales' in monthly.columns:
@@ -98,46 +120,60 @@ def calculate_monthly_metrics(df: pd.DataFrame) -> Optional[pd.DataFrame]:
     return monthly
 
 
-def get_top_items(df: pd.DataFrame, group_col: str, n: int = 10, by: str = 'Sales') -> Optional[pd.DataFrame]:
+def get_item_totals(df: pd.DataFrame, group_col: str) -> Optional[pd.DataFrame]:
     """
-    Get top N items by a given metric.
+    Get sales, profit, quantity and orders per item, unranked.
     
     Args:
         df: Prepared dataframe
         group_col: Standardized column name to group by (e.g., '_product', '_category')
-        n: Number of items to return
-        by: Metric to rank by ('Sales', 'Profit', 'Quantity')
     """
     if group_col not in df.columns or '_sales' not in df.columns:
         return None
     
-    agg_dict = {'_sales': 'sum'}
+    measures = {'Sales': ('_sales', 'sum')}
     
     if '_profit' in df.columns:
-        agg_dict['_profit'] = 'sum'
+        measures['Profit'] = ('_profit', 'sum')
     
     if '_quantity' in df.columns:
-        agg_dict['_quantity'] = 'sum'
+        measures['Quantity'] = ('_quantity', 'sum')
     
     if '_order_id' in df.columns:
-        agg_dict['_order_id'] = 'nunique'
-    
-    items = df.groupby(group_col).agg(agg_dict).reset_index()
+        measures['Orders'] = ('_order_id', 'nunique')
     
-    # Clean column names
-    col_map = {
-        group_col: 'Name',
-        '_sales': 'Sales',
-        '_profit': 'Profit',
-        '_quantity': 'Quantity',
-        '_order_id': 'Orders'
-    }
-    items = items.rename(columns=col_map)
+    return _group_totals(df, group_col, 'Name', measures)
+
+
+def get_product_totals(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Get per-product totals."""
+    return get_item_totals(df, '_product')
+
+
+def get_top_items(df: pd.DataFrame, group_col: str, n: int = 10, by: str = 'Sales') -> Optional[pd.DataFrame]:
+    """
+    Get top N items by a given metric.
     
-    sort_col = by if by in items.columns else 'Sales'
-    items = items.sort_values(sort_col, ascending=False).head(n)
+    Args:
+        df: Prepared dataframe
+        group_col: Standardized column name to group by (e.g., '_product', '_category')
+        n: Number of items to return
+        by: Metric to rank by ('Sales', 'Profit', 'Quantity')
+    """
+    return rank_top(get_item_totals(df, group_col), n, by)
+
+
+def rank_top(totals: Optional[pd.DataFrame], n: int = 10, by: str = 'Sales') -> Optional[pd.DataFrame]:
+    """
+    Take the top N rows of a per-group totals table.
     
-    return items
+    The totals are aggregated once per filter state, so moving a top-N
+    slider or switching the ranking metric only re-ranks the groups.
+    """
+    if totals is None:
+        return None
+    sort_col = by if by in totals.columns else 'Sales'
+    return _top_n(totals, sort_col, n)
 
 
 def get_category_breakdown(df: pd.DataFrame) -> Optional[pd.DataFrame]:
@@ -158,36 +194,30 @@ def get_segment_breakdown(df: pd.DataFrame) -> Optional[pd.DataFrame]:
 def get_breakdown(df: pd.DataFrame, col: str, col_name: str) -> Optional[pd.DataFrame]:
     """
     Get sales/profit breakdown by a dimension.
+    
+    All measures come from one named aggregation, so the output columns
+    need no renaming pass; the groups are left unsorted since the result
+    is ranked by sales anyway.
     """
     if col not in df.columns or '_sales' not in df.columns:
         return None
     
-    agg_dict = {'_sales': 'sum'}
+    named_aggs = {'Sales': ('_sales', 'sum')}
     
     if '_profit' in df.columns:
-        agg_dict['_profit'] = 'sum'
+        named_aggs['Profit'] = ('_profit', 'sum')
     
     if '_quantity' in df.columns:
-        agg_dict['_quantity'] = 'sum'
+        named_aggs['Quantity'] = ('_quantity', 'sum')
     
     if '_order_id' in df.columns:
-        agg_dict['_order_id'] = 'nunique'
+        named_aggs['Orders'] = ('_order_id', 'nunique')
     
     if '_customer' in df.columns:
-        agg_dict['_customer'] = 'nunique'
-    
-    breakdown = df.groupby(col).agg(agg_dict).reset_index()
-    
-    # Rename columns
-    col_map = {
-        col: col_name,
-        '_sales': 'Sales',
-        '_profit': 'Profit',
-        '_quantity': 'Quantity',
-        '_order_id': 'Orders',
-        '_customer': 'Customers'
-    }
-    breakdown = breakdown.rename(columns=col_map)
+        named_aggs['Customers'] = ('_customer', 'nunique')
+    
+    breakdown = df.groupby(col, sort=False, observed=True).agg(**named_aggs).reset_index()
+    breakdown = breakdown.rename(columns={col: col_name})
     
     # Calculate profit margin if both columns exist
     if 'Sales' in breakdown.columns and 'Profit' in breakdown.columns:
@@ -200,61 +230,145 @@ def get_breakdown(df: pd.DataFrame, col: str, col_name: str) -> Optional[pd.Data
     return breakdown.sort_values('Sales', ascending=False)
 
 
-def get_top_customers(df: pd.DataFrame, n: int = 10) -> Optional[pd.DataFrame]:
-    """Get top N customers by revenue."""
+def get_customer_totals(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Get sales, profit, orders and items per customer, unranked."""
     if '_customer' not in df.columns or '_sales' not in df.columns:
         return None
     
-    agg_dict = {'_sales': 'sum'}
+    measures = {'Sales': ('_sales', 'sum')}
     
     if '_profit' in df.columns:
-        agg_dict['_profit'] = 'sum'
+        measures['Profit'] = ('_profit', 'sum')
     
     if '_order_id' in df.columns:
-        agg_dict['_order_id'] = 'nunique'
+        measures['Orders'] = ('_order_id', 'nunique')
     
     if '_quantity' in df.columns:
-        agg_dict['_quantity'] = 'sum'
+        measures['Items'] = ('_quantity', 'sum')
     
-    customers = df.groupby('_customer').agg(agg_dict).reset_index()
+    return _group_totals(df, '_customer', 'Customer', measures)
+
+
+def get_top_customers(df: pd.DataFrame, n: int = 10) -> Optional[pd.DataFrame]:
+    """Get top N customers by revenue."""
+    return rank_top(get_customer_totals(df), n)
+
+
+def _distinct_per_group(codes: np.ndarray, n_groups: int, values: pd.Series, factorized: tuple = None) -> np.ndarray:
+    """
+    Count distinct non-null values per group, like groupby().nunique().
     
-    col_map = {
-        '_customer': 'Customer',
-        '_sales': 'Sales',
-        '_profit': 'Profit',
-        '_order_id': 'Orders',
-        '_quantity': 'Items'
-    }
-    customers = customers.rename(columns=col_map)
+    Each (group, value) code pair is packed into one integer so a single
+    np.unique pass deduplicates them, then the survivors are counted per
+    group with np.bincount. Pass `factorized`, the pd.factorize() result
+    for `values`, to skip factorizing them again.
+    """
+    value_codes, uniques = factorized if factorized is not None else pd.factorize(values)
+    valid = (codes >= 0) & (value_codes >= 0)
+    pairs = np.unique(codes[valid].astype(np.int64) * len(uniques) + value_codes[valid])
+    return np.bincount(pairs // max(len(uniques), 1), minlength=n_groups)
+
+
+def _group_totals(df: pd.DataFrame, group_col: str, key_name: str, measures: dict) -> pd.DataFrame:
+    """
+    Aggregate one row per group from a single factorize pass.
     
-    return customers.sort_values('Sales', ascending=False).head(n)
+    Args:
+        df: Prepared dataframe
+        group_col: Standardized column to group by
+        key_name: Output name for the group column
+        measures: {output name: (column, 'sum' or 'nunique')}; sums are
+            np.bincount scatter-adds over the group codes
+    """
+    codes, keys = pd.factorize(df[group_col])
+    valid = codes >= 0
+    # Plain values, so a categorical group column displays like any other
+    totals = pd.DataFrame({key_name: np.asarray(keys)})
+    
+    for name, (col, how) in measures.items():
+        if how == 'nunique':
+            totals[name] = _distinct_per_group(codes, len(keys), df[col])
+        else:
+            totals[name] = np.bincount(codes[valid], weights=df[col].to_numpy(dtype=float)[valid], minlength=len(keys))
+    
+    return totals
 
 
-def calculate_repeat_customers(df: pd.DataFrame) -> Tuple[int, int, float]:
+def _top_n(table: pd.DataFrame, by: str, n: int) -> pd.DataFrame:
+    """The n rows with the largest `by`, largest first, without sorting the rest."""
+    if len(table) > n:
+        table = table.iloc[np.argpartition(-table[by].to_numpy(), n - 1)[:n]]
+    return table.sort_values(by, ascending=False)
+
+
+# Lower edges of the order-frequency bins after the first: 1, 2, 3-4, 5-9, 10+
+ORDER_FREQUENCY_EDGES = np.array([2, 3, 5, 10])
+ORDER_FREQUENCY_LABELS = ('1', '2', '3-4', '5-9', '10+')
+
+
+def calculate_customer_loyalty(df: pd.DataFrame) -> Optional[dict]:
     """
-    Calculate repeat customer metrics.
+    Calculate repeat-customer metrics and the order-frequency distribution.
+    
+    Orders per customer are counted once into a NumPy array and binned
+    with np.searchsorted and np.bincount; every count below is then read
+    off the five bins.
     
     Returns:
-        Tuple: (total_customers, repeat_customers, repeat_rate)
+        dict: total_customers, repeat_customers, repeat_rate,
+            one_time_customers, loyal_customers (3+ orders) and
+            frequency (customers per ORDER_FREQUENCY_LABELS bin)
     """
     if '_customer' not in df.columns:
-        return 0, 0, 0
+        return None
     
+    codes, customers = pd.factorize(df['_customer'])
     if '_order_id' in df.columns:
-        customer_orders = df.groupby('_customer')['_order_id'].nunique()
+        customer_orders = _distinct_per_group(codes, len(customers), df['_order_id'])
     else:
         # Assume each row is an order
-        customer_orders = df.groupby('_customer').size()
+        customer_orders = np.bincount(codes[codes >= 0], minlength=len(customers))
     
+    frequency = np.bincount(np.searchsorted(ORDER_FREQUENCY_EDGES, customer_orders, side='right'), minlength=len(ORDER_FREQUENCY_LABELS))
     total_customers = len(customer_orders)
-    repeat_customers = (customer_orders >= 2).sum()
-    repeat_rate = (repeat_customers / total_customers * 100) if total_customers > 0 else 0
+    repeat_customers = int(frequency[1:].sum())
+    
+    return {
+        'total_customers': total_customers,
+        'repeat_customers': repeat_customers,
+        'repeat_rate': (repeat_customers / total_customers * 100) if total_customers > 0 else 0,
+        'one_time_customers': int(frequency[0]),
+        'loyal_customers': int(frequency[2:].sum()),
+        'frequency': frequency,
+    }
+
+
+def calculate_repeat_customers(df: pd.DataFrame) -> Tuple[int, int, float]:
+    """
+    Calculate repeat customer metrics.
+    
+    Returns:
+        Tuple: (total_customers, repeat_customers, repeat_rate)
+    """
+    loyalty = calculate_customer_loyalty(df)
+    if loyalty is None:
+        return 0, 0, 0
     
-    return total_customers, repeat_customers, repeat_rate
+    return loyalty['total_customers'], loyalty['repeat_customers'], loyalty['repeat_rate']
 
 
-def get_return_metrics(df: pd.DataFrame) -> dict:
-    """Calculate return-related metrics."""
+def get_return_metrics(df: pd.DataFrame, orders: tuple = None) -> dict:
+    """
+    Calculate return-related metrics.
+    
+    Every figure is a reduction over the returned flags, with no
+    boolean-indexed copy of the frame.
+    
+    Args:
+        df: Prepared dataframe
+        orders: Optional pd.factorize() result for _order_id, when the
+            caller already has one
+    """
     metrics = {
         'total_orders': 0,
         'returned_orders': 0,
@@ -266,59 +380,128 @@ def get_return_metrics(df: pd.DataFrame) -> dict:
     if '_returned' not in df.columns:
         return metrics
     
+    returned = df['_returned'].to_numpy(dtype=bool)
+    
     if '_order_id' in df.columns:
-        metrics['total_orders'] = df['_order_id'].nunique()
-        metrics['returned_orders'] = df[df['_returned']]['_order_id'].nunique()
+        order_codes, order_ids = orders if orders is not None else pd.factorize(df['_order_id'])
+        metrics['total_orders'] = len(order_ids)
+        metrics['returned_orders'] = len(np.unique(order_codes[returned & (order_codes >= 0)]))
     else:
         metrics['total_orders'] = len(df)
-        metrics['returned_orders'] = df['_returned'].sum()
+        metrics['returned_orders'] = int(returned.sum())
     
     if metrics['total_orders'] > 0:
         metrics['return_rate'] = (metrics['returned_orders'] / metrics['total_orders'] * 100)
     
     if '_sales' in df.columns:
-        metrics['returned_sales'] = df[df['_returned']]['_sales'].sum()
+        metrics['returned_sales'] = df['_sales'].to_numpy()[returned].sum()
     
     if '_profit' in df.columns:
-        metrics['returned_profit_loss'] = df[df['_returned']]['_profit'].sum()
+        metrics['returned_profit_loss'] = df['_profit'].to_numpy()[returned].sum()
     
     return metrics
 
 
-def get_items_by_return_rate(df: pd.DataFrame, group_col: str, col_name: str, n: int = 10) -> Optional[pd.DataFrame]:
-    """Get items with highest return rates."""
+def get_return_rate_totals(df: pd.DataFrame, group_col: str, col_name: str, orders: tuple = None) -> Optional[pd.DataFrame]:
+    """
+    Get every item with returns, highest return rate first.
+    
+    `orders` is an optional pd.factorize() result for _order_id, reused
+    for the distinct order counts.
+    """
     if group_col not in df.columns or '_returned' not in df.columns:
         return None
     
-    agg_dict = {'_returned': 'sum'}
+    # Factorize once and aggregate with np.bincount instead of a hashed groupby;
+    # sorted codes keep the groupby's key order for tied return rates
+    codes, keys = pd.factorize(df[group_col], sort=True)
+    valid = codes >= 0
+    group = codes[valid]
+    n_groups = len(keys)
+    
+    items = pd.DataFrame({col_name: keys})
+    items['Returns'] = np.bincount(group, weights=df['_returned'].to_numpy(dtype=float)[valid], minlength=n_groups).astype(np.int64)
     
     if '_order_id' in df.columns:
-        agg_dict['_order_id'] = 'nunique'
+        items['Total Orders'] = _distinct_per_group(codes, n_groups, df['_order_id'], factorized=orders)
+    else:
+        # If no order_id, use row count
+        items['Total Orders'] = np.bincount(group, minlength=n_groups)
     
     if '_sales' in df.columns:
-        agg_dict['_sales'] = 'sum'
+        items['Sales'] = np.bincount(group, weights=df['_sales'].to_numpy(dtype=float)[valid], minlength=n_groups)
     
     if '_profit' in df.columns:
-        agg_dict['_profit'] = 'sum'
-    
-    items = df.groupby(group_col).agg(agg_dict).reset_index()
-    
-    col_map = {
-        group_col: col_name,
-        '_returned': 'Returns',
-        '_order_id': 'Total Orders',
-        '_sales': 'Sales',
-        '_profit': 'Profit'
-    }
-    items = items.rename(columns=col_map)
-    
-    # If no order_id, use row count
-    if 'Total Orders' not in items.columns:
-        items['Total Orders'] = df.groupby(group_col).size().values
+        items['Profit'] = np.bincount(group, weights=df['_profit'].to_numpy(dtype=float)[valid], minlength=n_groups)
     
     items['Return Rate'] = (items['Returns'] / items['Total Orders'] * 100).round(2)
     
     # Filter to items with returns
     items = items[items['Returns'] > 0]
     
-    return items.sort_values('Return Rate', ascending=False).head(n)
+    return items.sort_values('Return Rate', ascending=False)
+
+
+def compute_returns_bundle(df: pd.DataFrame) -> dict:
+    """
+    Compute the return metrics and per-product return rates together.
+    
+    The order ids are factorized once and shared by the headline counts
+    and the product table's distinct-order counts.
+    
+    Returns:
+        dict: metrics (as get_return_metrics) and products (as
+            get_return_rate_totals; None without a product column)
+    """
+    orders = pd.factorize(df['_order_id']) if '_order_id' in df.columns else None
+    products = None
+    if '_product' in df.columns:
+        products = get_return_rate_totals(df, '_product', 'Product', orders=orders)
+    return {'metrics': get_return_metrics(df, orders=orders), 'products': products}
+
+
+def get_items_by_return_rate(df: pd.DataFrame, group_col: str, col_name: str, n: int = 10) -> Optional[pd.DataFrame]:
+    """Get items with highest return rates."""
+    items = get_return_rate_totals(df, group_col, col_name)
+    return items.head(n) if items is not None else None
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def calculate_sections(df: pd.DataFrame, options) -> dict:
+    """
+    Compute the aggregates behind every dashboard section in one call.
+    
+    The section groupbys are independent, so they are handed to a small
+    thread pool while the KPIs are summed on the calling thread. Only the
+    NumPy reductions and pandas' compiled group sums release the GIL;
+    factorizing keys and the Python around them do not, so the overlap
+    is partial and has not been measured. Cached as a whole, so returning
+    to an earlier filter combination skips all of them.
+    
+    Args:
+        df: Filtered dataframe with standardized columns
+        options: FilterOpts from get_filter_options
+    
+    Returns:
+        dict: kpis, monthly, category, region, loyalty, returns, and
+            the unranked products and customers totals that rank_top()
+            slices; returns is a compute_returns_bundle() dict; a section
+            whose column is unmapped is None
+    """
+    jobs = {
+        'monthly': (options.has_date, calculate_monthly_metrics),
+        'category': (options.has_category, get_category_breakdown),
+        'region': (options.has_region, get_region_breakdown),
+        'loyalty': (options.has_customer, calculate_customer_loyalty),
+        'returns': (options.has_returned, compute_returns_bundle),
+        'products': (options.has_product, get_product_totals),
+        'customers': (options.has_customer, get_customer_totals),
+    }
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = {name: pool.submit(func, df) for name, (enabled, func) in jobs.items() if enabled}
+        sections = {'kpis': calculate_kpis(df, options)}
+    
+    for name in jobs:
+        sections[name] = futures[name].result() if name in futures else None
+    
+    return sections
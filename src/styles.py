@@ -0,0 +1,186 @@
+"""
+Page chrome for Data Dash: the stylesheet and the animated background.
+"""
+
+import re
+from pathlib import Path
+
+import streamlit as st
+
+ASSETS_DIR = Path(__file__).parent.parent / 'assets'
+
+
+# Animated background: deep-space particles + shooting stars + orbs
+BACKGROUND_HTML = """
+<div class="orb orb-1"></div>
+<div class="orb orb-2"></div>
+<div class="orb orb-3"></div>
+<canvas id="bg-canvas"></canvas>
+<script>
+(function() {
+    var canvas = document.getElementById('bg-canvas');
+    if (!canvas) return;
+    if (window.matchMedia && matchMedia('(prefers-reduced-motion: reduce)').matches) return;
+    // The whole simulation lives in scene() so it can run inside a Web Worker
+    // on an OffscreenCanvas, off the main thread Streamlit renders on.
+    function scene(canvas, W, H, NUM) {
+        var ctx = canvas.getContext('2d');
+        var tick = typeof requestAnimationFrame === 'function' ? requestAnimationFrame : function(cb){ setTimeout(cb, 16); };
+        function rand(a,b){return Math.random()*(b-a)+a;}
+        var mouse={x:-9999,y:-9999};
+        var PAL=[[41,151,255],[191,90,242],[100,210,255],[48,209,88],[255,159,10]];
+        var RGB=PAL.map(function(c){return c[0]+','+c[1]+','+c[2];});
+        var MD=150, MOUSE_D=200;
+        // Particle state as parallel typed arrays instead of an array of objects
+        var X=new Float32Array(NUM), Y=new Float32Array(NUM), VX=new Float32Array(NUM), VY=new Float32Array(NUM),
+            R=new Float32Array(NUM), A=new Float32Array(NUM), PS=new Float32Array(NUM), PO=new Float32Array(NUM),
+            PULSE=new Float32Array(NUM), C=new Uint8Array(NUM);
+        for(var i=0;i<NUM;i++){
+            C[i]=Math.floor(Math.random()*PAL.length);
+            X[i]=rand(0,W);Y[i]=rand(0,H);VX[i]=rand(-0.3,0.3);VY[i]=rand(-0.3,0.3);
+            R[i]=rand(1.2,3.0);A[i]=rand(0.4,1.0);PS[i]=rand(0.01,0.03);PO[i]=rand(0,Math.PI*2);
+        }
+        // Uniform grid with MD-sized cells, stored as linked lists in typed arrays:
+        // any neighbour within MD sits in the 3x3 block of cells around a particle.
+        var GX, GY, head, next=new Int32Array(NUM);
+        function resize(w,h){
+            W=w;H=h;canvas.width=w;canvas.height=h;
+            GX=Math.ceil((w+20)/MD)+1;GY=Math.ceil((h+20)/MD)+1;head=new Int32Array(GX*GY);
+        }
+        function cell(v,n){var c=Math.floor((v+10)/MD);return c<0?0:(c>=n?n-1:c);}
+        resize(W,H);
+        var stars=[], ripples=[], frame=0, running=true, idle=false;
+        function spawnStar(){
+            var c=PAL[Math.floor(Math.random()*PAL.length)];
+            var ang=rand(-0.3,0.3)+Math.PI*0.25, spd=rand(8,18);
+            stars.push({x:rand(0,W),y:rand(0,H*0.5),
+                vx:Math.cos(ang)*spd,vy:Math.sin(ang)*spd,
+                len:rand(60,160),life:1.0,decay:rand(0.012,0.025),cr:c[0],cg:c[1],cb:c[2]});
+        }
+        for(var s=0;s<3;s++) spawnStar();
+        function draw(){
+            // While hidden, let the pending frame lapse instead of scheduling more
+            if(!running){idle=true;return;}
+            frame++;
+            ctx.clearRect(0,0,W,H);
+            if(frame%120===0) spawnStar();
+            for(var s=stars.length-1;s>=0;s--){
+                var st=stars[s];
+                var g=ctx.createLinearGradient(st.x,st.y,st.x-st.vx*(st.len/10),st.y-st.vy*(st.len/10));
+                g.addColorStop(0,'rgba('+st.cr+','+st.cg+','+st.cb+','+st.life*0.9+')');
+                g.addColorStop(1,'rgba('+st.cr+','+st.cg+','+st.cb+',0)');
+                ctx.beginPath();ctx.moveTo(st.x,st.y);
+                ctx.lineTo(st.x-st.vx*(st.len/10),st.y-st.vy*(st.len/10));
+                ctx.strokeStyle=g;ctx.lineWidth=1.5*st.life;ctx.stroke();
+                ctx.beginPath();ctx.arc(st.x,st.y,2*st.life,0,Math.PI*2);
+                ctx.fillStyle='rgba('+st.cr+','+st.cg+','+st.cb+','+st.life+')';ctx.fill();
+                st.x+=st.vx;st.y+=st.vy;st.life-=st.decay;
+                if(st.life<=0) stars.splice(s,1);
+            }
+            for(var ri=ripples.length-1;ri>=0;ri--){
+                var rp=ripples[ri];
+                ctx.beginPath();ctx.arc(rp.x,rp.y,rp.r,0,Math.PI*2);
+                ctx.strokeStyle='rgba(41,151,255,'+rp.life*0.5+')';ctx.lineWidth=1.5;ctx.stroke();
+                rp.r+=4;rp.life-=0.03;
+                if(rp.life<=0) ripples.splice(ri,1);
+            }
+            head.fill(-1);
+            for(var i=0;i<NUM;i++){
+                var k=cell(Y[i],GY)*GX+cell(X[i],GX);
+                next[i]=head[k];head[k]=i;
+                PULSE[i]=Math.sin(frame*PS[i]+PO[i])*0.25+0.75;
+            }
+            ctx.lineWidth=0.6;
+            for(var i=0;i<NUM;i++){
+                var cx=cell(X[i],GX), cy=cell(Y[i],GY);
+                for(var gy=Math.max(cy-1,0);gy<=Math.min(cy+1,GY-1);gy++){
+                    for(var gx=Math.max(cx-1,0);gx<=Math.min(cx+1,GX-1);gx++){
+                        for(var j=head[gy*GX+gx];j!==-1;j=next[j]){
+                            if(j<=i) continue;
+                            var dx=X[i]-X[j],dy=Y[i]-Y[j],dist=Math.sqrt(dx*dx+dy*dy);
+                            if(dist<MD){
+                                var la=(1-dist/MD)*0.2*PULSE[i];
+                                ctx.beginPath();ctx.moveTo(X[i],Y[i]);ctx.lineTo(X[j],Y[j]);
+                                ctx.strokeStyle='rgba('+RGB[C[i]]+','+la+')';ctx.stroke();
+                            }
+                        }
+                    }
+                }
+            }
+            for(var i=0;i<NUM;i++){
+                var a=A[i]*PULSE[i], rgb=RGB[C[i]];
+                var mdx=mouse.x-X[i],mdy=mouse.y-Y[i],md=Math.sqrt(mdx*mdx+mdy*mdy);
+                if(md<MOUSE_D){
+                    var ma=(1-md/MOUSE_D)*0.5;
+                    ctx.beginPath();ctx.moveTo(X[i],Y[i]);ctx.lineTo(mouse.x,mouse.y);
+                    ctx.strokeStyle='rgba('+rgb+','+ma+')';
+                    ctx.lineWidth=0.9;ctx.stroke();
+                    var force=(1-md/MOUSE_D)*0.5;
+                    VX[i]-=(mdx/md)*force*0.06;VY[i]-=(mdy/md)*force*0.06;
+                }
+                var spd=Math.sqrt(VX[i]*VX[i]+VY[i]*VY[i]);
+                if(spd>1.2){VX[i]*=0.95;VY[i]*=0.95;}
+                if(spd<0.1){VX[i]+=rand(-0.05,0.05);VY[i]+=rand(-0.05,0.05);}
+                var grd=ctx.createRadialGradient(X[i],Y[i],0,X[i],Y[i],R[i]*4);
+                grd.addColorStop(0,'rgba('+rgb+','+a+')');
+                grd.addColorStop(0.4,'rgba('+rgb+','+(a*0.3)+')');
+                grd.addColorStop(1,'rgba('+rgb+',0)');
+                ctx.beginPath();ctx.arc(X[i],Y[i],R[i]*4,0,Math.PI*2);ctx.fillStyle=grd;ctx.fill();
+                ctx.beginPath();ctx.arc(X[i],Y[i],R[i],0,Math.PI*2);
+                ctx.fillStyle='rgba('+rgb+','+a+')';ctx.fill();
+                X[i]+=VX[i];Y[i]+=VY[i];
+                if(X[i]<-10)X[i]=W+10;
+                if(X[i]>W+10)X[i]=-10;
+                if(Y[i]<-10)Y[i]=H+10;
+                if(Y[i]>H+10)Y[i]=-10;
+            }
+            tick(draw);
+        }
+        draw();
+        return {
+            resize: resize,
+            mouse: function(x,y){mouse.x=x;mouse.y=y;},
+            visible: function(v){running=!!v;if(running&&idle){idle=false;tick(draw);}},
+            click: function(x,y){ripples.push({x:x,y:y,r:0,life:1.0});}
+        };
+    }
+    // Fewer particles on machines with few cores
+    var num = Math.min(90, Math.max(30, (navigator.hardwareConcurrency || 4) * 12));
+    var send;
+    if (canvas.transferControlToOffscreen && typeof Worker !== 'undefined') {
+        var off = canvas.transferControlToOffscreen();
+        var src = scene.toString() +
+            '\nvar api;self.onmessage=function(e){var m=e.data;' +
+            'if(m.type==="init"){api=scene(m.canvas,m.x,m.y,m.num);}else if(api){api[m.type](m.x,m.y);}};';
+        var worker = new Worker(URL.createObjectURL(new Blob([src], {type: 'application/javascript'})));
+        worker.postMessage({type: 'init', canvas: off, x: window.innerWidth, y: window.innerHeight, num: num}, [off]);
+        send = function(type, x, y) { worker.postMessage({type: type, x: x, y: y}); };
+    } else {
+        var api = scene(canvas, window.innerWidth, window.innerHeight, num);
+        send = function(type, x, y) { api[type](x, y); };
+    }
+    window.addEventListener('resize', function(){ send('resize', window.innerWidth, window.innerHeight); });
+    window.addEventListener('mousemove', function(e){ send('mouse', e.clientX, e.clientY); });
+    window.addEventListener('mouseleave', function(){ send('mouse', -9999, -9999); });
+    window.addEventListener('click', function(e){ send('click', e.clientX, e.clientY); });
+    document.addEventListener('visibilitychange', function(){
+        send('mouse', -9999, -9999);
+        send('visible', !document.hidden);
+    });
+})();
+</script>
+"""
+
+
+def minify_css(css):
+    """Drop comments and layout whitespace from a stylesheet."""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};,>])\s*', r'\1', css).strip()
+
+
+@st.cache_resource
+def load_chrome():
+    """Build the minified stylesheet and background markup once per server process."""
+    css = minify_css((ASSETS_DIR / 'home.css').read_text(encoding='utf-8'))
+    return f"<style>{css}</style>{BACKGROUND_HTML}"
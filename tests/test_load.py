@@ -0,0 +1,22 @@
+"""Tests for src/load.py."""
+
+import datetime
+
+import pandas as pd
+
+from src.load import filter_data, prepare_data
+
+
+def test_date_filter_on_offset_timestamps():
+    df = pd.DataFrame({
+        'Order Date': ['2024-01-05T23:30:00+02:00', '2024-01-10T08:00:00-05:00', None, '2024-02-01T00:00:00+00:00'],
+        'Sales': [10.0, 20.0, 30.0, 40.0],
+    })
+    prepared = prepare_data(df, {'date': 'Order Date', 'sales': 'Sales'})
+    
+    # Kept as naive UTC: 23:30 at +02:00 is 21:30 UTC on the same day
+    assert prepared['_date'].dt.tz is None
+    assert prepared['_date'].iloc[0] == pd.Timestamp('2024-01-05 21:30:00')
+    
+    filtered = filter_data(prepared, start_date=datetime.date(2024, 1, 6), end_date=datetime.date(2024, 1, 31))
+    assert filtered['_sales'].tolist() == [20.0]